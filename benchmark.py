@@ -1,7 +1,26 @@
+'''
+This module evaluates the performance of the sudoku solvers. run_benchmark() solves a fixed set of
+puzzles with a solver and measures the solve time of each one (with time.perf_counter_ns). The
+results (accuracy, latency percentiles and throughput) can be saved as JSON or CSV and compared
+against a baseline file to detect regressions.
+
+It can also be used as a CLI:
+
+    python -O benchmark.py dlx propagation --n 1000 --seed 0 --output results.json
+    python -O benchmark.py dlx --n 1000 --seed 0 --baseline results.json --threshold 0.1
+'''
 
 from argparse import ArgumentParser
+from collections import namedtuple
+from itertools import islice
+from time import perf_counter_ns
+import sys
+import os
 import re
+import csv
+import json
 import importlib
+import numpy as np
 
 
 def get_solver(name):
@@ -11,22 +30,353 @@ def get_solver(name):
         'baseline': 'solver.BasicSudokuIterativeSolver',
 
         'deepsearch': 'deepsearchsolver.DeepSearchSudokuSolver',
-        'deep-search': 'deepsearchsolver.DeepSearchSudokuSolver'
+        'deep-search': 'deepsearchsolver.DeepSearchSudokuSolver',
+        'trail': 'deepsearchsolver.TrailDeepSearchSudokuSolver',
+
+        'dlx': 'dlxsolver.DLXSudokuSolver',
+
+        'propagation': 'propagationsolver.PropagationSudokuSolver',
+
+        'cached': 'cachedsolver.CachedSudokuSolver'
     }
 
     if name not in paths:
         raise Exception()
-    module, cls_name = re.match("^(.+)\.(.+)$", 'solvers.' + paths[name]).groups()
+    module, cls_name = re.match(r"^(.+)\.(.+)$", 'solvers.' + paths[name]).groups()
     cls = importlib.import_module(module).__dict__[cls_name]
 
     solver = cls()
     return solver
 
 
+
+### Benchmark results
+
+# Metrics which are better when lower or higher (used to detect regressions)
+LOWER_IS_BETTER = ('mean', 'p50', 'p90', 'p99', 'max')
+HIGHER_IS_BETTER = ('accuracy', 'throughput')
+
+
+# Fields of the results saved on files
+RESULT_FIELDS = ('solver', 'count', 'solved', 'unsolved', 'invalid', 'timeouts', 'accuracy',
+                 'mean', 'p50', 'p90', 'p99', 'max', 'throughput', 'elapsed')
+
+
+class BenchmarkResult(namedtuple('BenchmarkResult', RESULT_FIELDS + ('times', 'stats'), defaults=(None, None))):
+    '''
+    Result of run_benchmark(): solver is the name of the solver and count the number of puzzles
+    measured (warmup runs are not included). solved is the number of puzzles solved correctly,
+    unsolved the number of puzzles the solver couldnt solve (or solved wrongly), invalid the
+    number of puzzles it rejected as invalid and timeouts the number of puzzles which exceeded the
+    time or nodes limit. accuracy is solved / count.
+    mean, p50, p90, p99 and max are statistics of the solve times of all the puzzles (in seconds),
+    throughput is the number of puzzles solved per second (wall time) and elapsed the total wall
+    time (in seconds).
+    times is an array with the solve time of each puzzle and stats a dictionary with an array for
+    each counter of SolverStats with its value on each puzzle (None if statistics were not collected).
+    They are not saved on files
+    '''
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in RESULT_FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Creates a result from a dictionary (values can be strings, like the rows of a CSV file).
+        Results saved before timeouts were recorded have no timeouts
+        '''
+        return cls(**{field: data[field] if field == 'solver' else
+            (int if field in ('count', 'solved', 'unsolved', 'invalid', 'timeouts') else float)(data.get(field, 0))
+            for field in RESULT_FIELDS})
+
+
+    def histograms(self, bins=10):
+        '''
+        Returns the histograms of the solve times and the counters of each puzzle: A dictionary
+        with an item for the times ('time') and each counter in stats. Values are tuples with the
+        number of puzzles on each bin and the bin edges (like numpy.histogram)
+        '''
+        values = dict(time=self.times, **(self.stats or {}))
+        return {name: np.histogram(value, bins) for name, value in values.items() if value is not None}
+
+
+    def slowest(self, k=10):
+        '''
+        Returns the indices of the k puzzles which took more time to be solved (slowest first)
+        '''
+        return np.argsort(self.times)[::-1][:k]
+
+
+    def __eq__(self, other):
+        # Results are equal if their fields saved on files are equal
+        return isinstance(other, BenchmarkResult) and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+
+    def __str__(self):
+        info = []
+        info.append("{:2.2f}% accuracy".format(100 * self.accuracy))
+        info.append("p50 {:.3f} ms".format(1000 * self.p50))
+        info.append("p90 {:.3f} ms".format(1000 * self.p90))
+        info.append("p99 {:.3f} ms".format(1000 * self.p99))
+        info.append("max {:.3f} ms".format(1000 * self.max))
+        info.append("{:.1f} sudokus/sec".format(self.throughput))
+        if self.invalid > 0:
+            info.append("{} failures".format(self.invalid))
+        if self.timeouts > 0:
+            info.append("{} timeouts".format(self.timeouts))
+        return self.solver.ljust(16) + '  '.join([stat.ljust(18) for stat in info])
+
+
+
+def save_results(results, path):
+    '''
+    Saves a list of benchmark results on a file. The format is JSON unless the file
+    extension is .csv. The solve times and counters of each puzzle are not saved (only their
+    histograms on JSON files)
+    '''
+    rows = [result.to_dict() for result in results]
+    with open(path, 'w', newline='') as file:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            # JSON files also contain the histograms of the counters (if collected)
+            for row, result in zip(rows, results):
+                if result.stats is not None:
+                    row['histograms'] = {name: dict(counts=counts.tolist(), edges=edges.tolist())
+                                         for name, (counts, edges) in result.histograms().items()}
+            json.dump(rows, file, indent=2)
+
+
+def load_results(path):
+    '''
+    Loads the benchmark results saved with save_results()
+    '''
+    with open(path, 'r', newline='') as file:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            rows = list(csv.DictReader(file))
+        else:
+            rows = json.load(file)
+    return [BenchmarkResult.from_dict(row) for row in rows]
+
+
+def compare_results(results, baseline, threshold=0.1, metrics=('p50', 'throughput')):
+    '''
+    Compares benchmark results against a baseline (results of the same solvers are compared).
+    Returns a list of tuples (solver, metric, baseline value, value, relative change) with the
+    metrics which got worse more than the given threshold (a fraction of the baseline value).
+    Accuracy is always checked (it can never be lower than the baseline).
+    '''
+    baseline = {result.solver: result for result in baseline}
+    regressions = []
+    for result in results:
+        if result.solver not in baseline:
+            continue
+        base = baseline[result.solver]
+        for metric in ('accuracy',) + tuple(m for m in metrics if m != 'accuracy'):
+            old, new = getattr(base, metric), getattr(result, metric)
+            change = (new - old) / old if old != 0 else 0.0
+            if metric in LOWER_IS_BETTER:
+                worse = change > threshold
+            else:
+                worse = -change > (threshold if metric != 'accuracy' else 0)
+            if worse:
+                regressions.append((result.solver, metric, old, new, change))
+    return regressions
+
+
+
+### Benchmark
+
+def _correct(result, solution):
+    # Returns True if the result is a solution of the sudoku. Sudokus with several solutions
+    # can be solved with a different one
+    if not result.solved:
+        return False
+    if solution is not None and result.solution == solution:
+        return True
+    return result.solution.solved and result.sudoku < result.solution
+
+
+def run_benchmark(solver, sudokus, solutions=None, name=None, warmup=0, workers=1, chunksize=None, stats=False,
+                  timeout=None, max_nodes=None, verbose=False):
+    '''
+    Solves the given sudokus with a solver and measures its performance.
+    The given sudokus are not modified.
+
+    :param solver: A SudokuSolver instance
+    :param sudokus: A list of sudokus (Sudoku instances or array-like with 81 numbers) or
+    a SudokuBatch instance
+    :param solutions: Solutions of the sudokus (optional, some of them can be None). If not given,
+    any valid completion is accepted as correct
+    :param name: Name of the solver used in the results (the class name by default)
+    :param warmup: Number of sudokus solved before the measurements (they are not counted). They
+    are taken from the start of the sudokus. Warmup runs are done in the current process
+    :param workers: Number of processes used to solve the sudokus. Solve times are measured inside
+    the workers, so the communication overhead is only counted on the throughput
+    :param chunksize: Number of sudokus sent to a worker at once (by default its chosen
+    depending on the number of sudokus and workers)
+    :param stats: If True, the statistics of the solver (check SudokuSolver.collect_stats) are
+    collected for each puzzle. Solve times include the overhead of the instrumentation
+    :param timeout, max_nodes: Limits to solve each puzzle (check SudokuSolver.solve). Puzzles
+    which exceed them are counted as timeouts, so the maximum solve time is bounded
+    :param verbose: If True, the progress is printed on stderr
+    :return Returns a BenchmarkResult instance
+    '''
+    from sudoku import Sudoku
+    from solvers.solver import SolveTimeout
+    assert warmup >= 0 and workers > 0
+
+    sudokus = [Sudoku(np.asarray(sudoku, dtype=np.uint8).reshape([9, 9])) for sudoku in sudokus]
+    n = len(sudokus)
+    if n == 0:
+        raise ValueError('At least one sudoku is required')
+    if solutions is not None:
+        solutions = [Sudoku(np.asarray(solution, dtype=np.uint8).reshape([9, 9])) if solution is not None else None
+                     for solution in solutions]
+        if len(solutions) != n:
+            raise ValueError('Each sudoku must have exactly one solution')
+
+    # The warmup uses the same limits, so it never takes longer than the benchmark
+    for sudoku in islice(_cycle(sudokus), warmup):
+        try:
+            solver.solve(sudoku.copy(), timeout=timeout, max_nodes=max_nodes)
+        except (ValueError, AssertionError, SolveTimeout):
+            pass
+
+    if chunksize is None and workers > 1:
+        chunksize = max(1, min(256, n // (workers * 8)))
+
+    times = np.zeros(n)
+    counters = None
+    enabled = solver.stats
+    if stats:
+        from solvers.stats import SolverStats
+        counters = {field: np.zeros(n, dtype=np.int64) for field in SolverStats.FIELDS}
+        solver.enable_stats()
+    else:
+        solver.disable_stats()
+
+    solved = invalid = timeouts = 0
+    t0 = perf_counter_ns()
+    try:
+        results = solver.solve_many(sudokus, workers=workers, ordered=True, chunksize=chunksize,
+                                    timeout=timeout, max_nodes=max_nodes)
+        for result in results:
+            times[result.index] = result.elapsed
+            if counters is not None:
+                for field, value in result.stats.items():
+                    counters[field][result.index] = value
+            if _correct(result, solutions[result.index] if solutions is not None else None):
+                solved += 1
+            elif result.error == 'invalid':
+                invalid += 1
+            elif result.error == 'timeout':
+                timeouts += 1
+
+            count = result.index + 1
+            if verbose and (count % max(1, n // 100) == 0 or count == n):
+                print('{} / {}'.format(count, n), end='\r', file=sys.stderr)
+    finally:
+        solver.stats = enabled
+    elapsed = perf_counter_ns() - t0
+    if verbose:
+        print(file=sys.stderr)
+
+    elapsed /= 1e9
+    p50, p90, p99 = np.percentile(times, [50, 90, 99]).tolist()
+    return BenchmarkResult(
+        name or type(solver).__name__, n, solved, n - solved - invalid - timeouts, invalid, timeouts, solved / n,
+        float(times.mean()), p50, p90, p99, float(times.max()), n / elapsed, elapsed, times, counters)
+
+
+def print_stats(result, k=5):
+    '''
+    Prints a summary of the counters collected on a benchmark (with stats enabled): Their
+    distribution, their correlation with the solve times and the k slowest puzzles
+    '''
+    times = result.times
+    for name, values in result.stats.items():
+        p50, p99 = np.percentile(values, [50, 99])
+        corr = np.corrcoef(values, times)[0, 1] if values.std() > 0 and times.std() > 0 else 0.0
+        print('    {:<24}mean {:<14.1f}p50 {:<12g}p99 {:<12g}max {:<12d}corr(time) {:+.2f}'.format(
+            name, values.mean(), p50, p99, values.max(), corr))
+    print('    slowest puzzles: ' + ', '.join('#{} ({:.3f} ms, {} nodes)'.format(
+        index, 1000 * times[index], result.stats['nodes'][index]) for index in result.slowest(k)))
+
+
+def _cycle(sudokus):
+    # Repeats the sudokus forever
+    while True:
+        yield from sudokus
+
+
+def get_puzzles(n, seed=0, source='generated', path=None, clues=None, difficulty=None, workers=1):
+    '''
+    Returns a fixed set of n puzzles and their solutions (two lists of sudokus) to run benchmarks.
+    :param source: 'generated' to create new puzzles with generator.SudokuGenerator, 'dataset' to
+    take them from the dataset (shuffled) or 'file' to read the first n sudokus of a file with
+    sudokuio.SudokuReader (solutions are only available for csv files)
+    :param seed: Seed used to generate or shuffle the puzzles (the same seed always returns
+    the same puzzles)
+    :param path: Path of the file if source is 'file'
+    :param clues, difficulty: Options passed to SudokuGenerator
+    '''
+    if source == 'generated':
+        from generator import SudokuGenerator
+        pairs = SudokuGenerator(clues, difficulty, seed).generate_many(n, workers=workers)
+    elif source == 'dataset':
+        from dataset import SudokuDataset
+        pairs = SudokuDataset().get_samples(shuffle=True, random_seed=seed, return_solutions=True)
+    elif source == 'file':
+        from sudokuio import SudokuReader
+        if os.path.splitext(path)[1].lower() == '.csv':
+            # The solutions column is optional (check the header or the first line)
+            with open(path, 'rb') as f:
+                solved = b',' in f.readline()
+            pairs = iter(SudokuReader(path, 'csv', solutions=True)) if solved else \
+                ((sudoku, None) for sudoku in SudokuReader(path, 'csv'))
+        else:
+            pairs = ((sudoku, None) for sudoku in SudokuReader(path))
+    else:
+        raise ValueError('Source of the puzzles must be "generated", "dataset" or "file"')
+
+    puzzles, solutions = [], []
+    for sudoku, solution in islice(pairs, n):
+        puzzles.append(sudoku.copy())
+        solutions.append(solution.copy() if solution is not None else None)
+    if any(solution is None for solution in solutions):
+        solutions = None
+    return puzzles, solutions
+
+
+
 if __name__ == '__main__':
     parser = ArgumentParser(description='CLI to benchmark sudoku solver algorithms')
-    parser.add_argument('solver', type=str)
+    parser.add_argument('solvers', type=str, nargs='+', help='Names of the solvers to be evaluated')
     parser.add_argument('--n', '--num-samples', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to solve the samples')
+    parser.add_argument('--warmup', type=int, default=0, help='Number of sudokus solved before the measurements')
+    parser.add_argument('--seed', type=int, default=0, help='Seed used to generate or shuffle the puzzles')
+    parser.add_argument('--source', type=str, choices=('generated', 'dataset'), default='generated',
+                        help='Where the puzzles are taken from (ignored if --puzzles is given)')
+    parser.add_argument('--puzzles', type=str, default=None, help='Read the puzzles from this file')
+    parser.add_argument('--clues', type=int, default=None, help='Number of clues of the generated puzzles')
+    parser.add_argument('--difficulty', type=str, default=None, help='Difficulty of the generated puzzles')
+    parser.add_argument('--timeout', type=float, default=None, help='Maximum number of seconds to solve each puzzle')
+    parser.add_argument('--max-nodes', type=int, default=None, help='Maximum number of search nodes for each puzzle')
+    parser.add_argument('--stats', action='store_true',
+                        help='Collect the search statistics of each puzzle (it slows down the solvers)')
+    parser.add_argument('--output', type=str, default=None, help='Save the results on this file (.json or .csv)')
+    parser.add_argument('--baseline', type=str, default=None, help='Compare the results with this file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Maximum relative regression allowed with respect to the baseline')
+    parser.add_argument('--metrics', type=str, default='p50,throughput',
+                        help='Metrics compared with the baseline (comma separated)')
 
     parsed_args = parser.parse_args()
 
@@ -34,13 +384,59 @@ if __name__ == '__main__':
     if n <= 0:
         parser.error('n argument must be a positive number')
 
-    try:
-        solver = get_solver(parsed_args.solver)
-    except:
-        parser.error('"{}" is not a valid sudoku algorithm'.format(parsed_args.solver))
+    workers = parsed_args.workers
+    if workers <= 0:
+        parser.error('workers argument must be a positive number')
+
+    if parsed_args.warmup < 0:
+        parser.error('warmup argument must be a non negative number')
+
+    if parsed_args.timeout is not None and not 0 < parsed_args.timeout < float('inf'):
+        parser.error('timeout argument must be a positive finite number')
+
+    if parsed_args.max_nodes is not None and parsed_args.max_nodes <= 0:
+        parser.error('max-nodes argument must be a positive number')
+
+    metrics = tuple(parsed_args.metrics.split(','))
+    for metric in metrics:
+        if metric not in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            parser.error('"{}" is not a valid metric'.format(metric))
+
+    solvers = []
+    for name in parsed_args.solvers:
+        try:
+            solvers.append(get_solver(name))
+        except:
+            parser.error('"{}" is not a valid sudoku algorithm'.format(name))
 
     if __debug__:
         print("Debugging is enabled: Add -O option to get better results")
 
+    # All the solvers use the same puzzles
+    try:
+        puzzles, solutions = get_puzzles(
+            n, parsed_args.seed, 'file' if parsed_args.puzzles else parsed_args.source, parsed_args.puzzles,
+            parsed_args.clues, parsed_args.difficulty, workers)
+    except ValueError as e:
+        parser.error(str(e))
+
     # Do benchmark
-    solver.benchmark(n)
+    results = []
+    for name, solver in zip(parsed_args.solvers, solvers):
+        result = run_benchmark(solver, puzzles, solutions, name=name, warmup=parsed_args.warmup, workers=workers,
+                               stats=parsed_args.stats, timeout=parsed_args.timeout, max_nodes=parsed_args.max_nodes,
+                               verbose=True)
+        print(result)
+        if parsed_args.stats:
+            print_stats(result)
+        results.append(result)
+
+    if parsed_args.output is not None:
+        save_results(results, parsed_args.output)
+
+    if parsed_args.baseline is not None:
+        regressions = compare_results(results, load_results(parsed_args.baseline), parsed_args.threshold, metrics)
+        for solver, metric, old, new, change in regressions:
+            print('Regression on {}: {} changed from {:.6g} to {:.6g} ({:+.1%})'.format(solver, metric, old, new, change))
+        if regressions:
+            sys.exit(1)
@@ -1,8 +1,10 @@
-
-
-import pandas as pd
+import os
+import json
+import tempfile
 import numpy as np
-from sudoku import Sudoku
+from itertools import count
+from sudoku import Sudoku, SudokuBatch
+from sudokuio import SudokuReader, DEFAULT_BLOCK_SIZE
 from utils.singleton import singleton
 
 # Points to the dataset file (must be a csv).
@@ -15,46 +17,190 @@ class SudokuDataset:
     This class provides a database of sudokus Each entry is a pair of sudoku configurations:
     The sudoku unsolved and solved. It 1M entries
     I got it from kaggle: https://www.kaggle.com/bryanpark/sudoku
+
+    The first time its used, the csv file is converted to a binary file (placed next to it, with the
+    same name but .npy extension) which stores an uint8 array of shape (N, 2, 81) with the numbers of the
+    N sudokus and their solutions. Later, that file is memory mapped so that any sample can be read
+    without parsing the csv file again. The binary file is rebuilt automatically if the csv file changes.
+
+    Entries can be accessed by index: dataset[i] returns the ith sudoku and its solution. dataset[indices]
+    (where indices is a slice or an array of indices) returns two SudokuBatch instances with the sudokus
+    and their solutions (they are read at once from the binary file).
     '''
     def __init__(self):
-        pass
+        self._data, self._source, self._url = None, None, None
+
+
+    @property
+    def cache_path(self):
+        '''
+        Returns the path of the binary file where the dataset is cached
+        '''
+        return os.path.splitext(DATASET_URL)[0] + '.npy'
+
+
+    def _source_info(self):
+        # Returns information about the csv file used to detect changes on it
+        stat = os.stat(DATASET_URL)
+        return dict(path=os.path.abspath(DATASET_URL), size=stat.st_size, mtime=stat.st_mtime_ns)
+
+
+    def _cache_outdated(self):
+        # Returns True if the binary file must be (re)built
+        if not os.path.exists(self.cache_path):
+            return True
+        if not os.path.exists(DATASET_URL):
+            # Only the binary file is available
+            return False
+        try:
+            with open(self.cache_path + '.json', 'r') as f:
+                return json.load(f) != self._source_info()
+        except (OSError, ValueError):
+            return True
+
+
+    def build_cache(self, block_size=DEFAULT_BLOCK_SIZE):
+        '''
+        Converts the csv file to the binary format and stores it at cache_path
+        :param block_size: Number of bytes of the csv file processed at once
+        '''
+        source = self._source_info()
+
+        chunks = []
+        reader = SudokuReader(DATASET_URL, format='csv', solutions=True, block_size=block_size)
+        for unsolved, solved in reader.batches():
+            entries = np.stack([unsolved.values.reshape([-1, 81]), solved.values.reshape([-1, 81])], axis=1)
+            _check_entries(entries)
+            chunks.append(entries)
+        data = np.concatenate(chunks) if chunks else np.zeros([0, 2, 81], dtype=np.uint8)
+
+        # Each file is written to a temporary file first (several processes could be building the
+        # cache at the same time)
+        _write_file(self.cache_path, lambda f: np.save(f, data))
+        _write_file(self.cache_path + '.json', lambda f: f.write(json.dumps(source).encode()))
+        self._data = None
 
-    def get_samples(self, shuffle=True, return_solutions=True, random_seed=None):
+
+    @property
+    def data(self):
+        '''
+        Returns a read-only uint8 memory mapped array of shape (N, 2, 81). data[i, 0] and data[i, 1]
+        are the numbers of the ith sudoku and its solution. The csv file is checked for changes
+        each time its called (indexing the dataset and len() only check it when its not opened yet)
+        '''
+        source = self._source_info() if os.path.exists(DATASET_URL) else None
+        if self._data is None or self._source != source or self._url != DATASET_URL:
+            if self._cache_outdated():
+                self.build_cache()
+            self._data = np.load(self.cache_path, mmap_mode='r')
+            self._source, self._url = source, DATASET_URL
+        return self._data
+
+
+    def _open_data(self):
+        # Same as data but the csv file is only checked for changes when its not opened yet
+        if self._data is None or self._url != DATASET_URL:
+            return self.data
+        return self._data
+
+
+    def __len__(self):
+        return self._open_data().shape[0]
+
+
+    def __getitem__(self, index):
+        data = self._open_data()
+        if hasattr(index, '__int__') and np.ndim(index) == 0:
+            entry = np.array(data[index])
+            return Sudoku(entry[0].reshape([9, 9])), Sudoku(entry[1].reshape([9, 9]))
+
+        entries = np.array(data[index])
+        return SudokuBatch(entries[:, 0]), SudokuBatch(entries[:, 1])
+
+
+    def get_batches(self, batch_size=1024, shuffle=True, return_solutions=True, random_seed=None,
+                    shard_index=0, num_shards=1, epoch=None):
+        '''
+        Creates an iterator that returns batches of samples from this database. Each batch is
+        read at once from the dataset and validated with vectorized operations.
+
+        :param batch_size: Number of samples on each batch (the last batch of each pass over the
+        dataset could be smaller)
+
+        :param shuffle: When this argument is set to True, the sudokus will be shuffled before
+        returned by this method (a new permutation of the whole dataset is used on each epoch)
+
+        :param random_seed: The random seed to be used in order to shuffle the samples
+
+        :param return_solutions: If True the iterator will return a tuple of two SudokuBatch
+        instances on each epoch (the sudokus unsolved and solved). If false, it only returns
+        the sudokus unsolved
+
+        :param shard_index, num_shards: The dataset order on each epoch (the same for all the
+        shards) is split in num_shards contiguous and disjoint parts and only the samples of the
+        part with the given index are returned. Each process reading from the dataset can use a
+        different shard. When shuffling with several shards, random_seed must be specified so that
+        all of them use the same order
+
+        :param epoch: If specified, only the samples of that epoch are returned. Otherwise, the
+        iterator never ends (it returns samples of the epochs 0, 1, 2, ...)
+        '''
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('Shard index must be a number in the range [0, num_shards)')
+        if shuffle and num_shards > 1 and random_seed is None:
+            raise ValueError('random_seed must be specified when shuffling a sharded dataset')
+
+        data = self.data
+        n = data.shape[0]
+        # Range of positions of this shard within the order of each epoch
+        first, last = n * shard_index // num_shards, n * (shard_index + 1) // num_shards
+        if first == last:
+            # Empty shard (or dataset): the epochs would never return any sample
+            return
+
+        epochs = count(0) if epoch is None else [epoch]
+        for epoch in epochs:
+            if shuffle:
+                random = np.random.default_rng(None if random_seed is None else [random_seed, epoch])
+                order = random.permutation(n)[first:last]
+
+            for start in range(first, last, batch_size):
+                if not shuffle:
+                    chunk = np.array(data[start:min(start+batch_size, last)])
+                else:
+                    chunk = data[order[start-first:min(start+batch_size, last)-first]]
+
+                unsolved, solved = _check_entries(chunk)
+                if not return_solutions:
+                    yield unsolved
+                else:
+                    yield unsolved, solved
+
+
+    def get_samples(self, shuffle=True, return_solutions=True, random_seed=None, batch_size=1024, **kwargs):
         '''
         Creates an iterator that returns samples from this database
 
         :param shuffle: When this argument is set to True, the sudokus will be shuffled before
-        returned by this method
+        returned by this method (a new permutation of the whole dataset is used on each epoch)
 
         :param random_seed: The random seed to be used in order to shuffle the samples
 
         :param return_solutions: If True the iterator will return a tuple on each epoch
         with two sudoku configurations (the sudoku unsolved and solved). If false, it only
         returns the sudoku unsolved
-        '''
-        def parse_sudoku(data):
-            sudoku = Sudoku(np.array(list(map(int, data)), dtype=np.uint8).reshape([9, 9]))
-            if not sudoku.valid:
-                raise ValueError('Invalid sudoku configuration found in dataset')
-            return sudoku
-
-        np.random.seed(random_seed)
-        while True:
-            for chunk in pd.read_csv(DATASET_URL, chunksize=50):
-                for i in np.random.permutation(chunk.shape[0]):
-                    entry = chunk.iloc[i]
-                    unsolved = parse_sudoku(entry['quizzes'])
-
-                    if not return_solutions:
-                        yield unsolved
-                        continue
-                    solved = parse_sudoku(entry['solutions'])
-
-                    # The solved configuration is really the solution to the unsolved configuration?
-                    if not (unsolved < solved and solved.full):
-                        raise ValueError('Invalid sudoku solution found in dataset')
 
-                    yield unsolved, solved
+        :param batch_size: Number of samples read (and validated) at once from the dataset
+
+        :param kwargs: Additional arguments (shard_index, num_shards and epoch) passed to
+        get_batches() to read only a part of the dataset
+        '''
+        for unsolved, solved in self.get_batches(batch_size, shuffle, True, random_seed, **kwargs):
+            for k in range(0, len(unsolved)):
+                if not return_solutions:
+                    yield Sudoku(unsolved.values[k])
+                else:
+                    yield Sudoku(unsolved.values[k]), Sudoku(solved.values[k])
 
 
     def get_sample(self, return_solution=True):
@@ -65,8 +211,38 @@ class SudokuDataset:
         return next(self.get_samples(shuffle=True, return_solutions=return_solution))
 
 
+
+def _write_file(path, write):
+    # Creates a file atomically: write is called with a temporary file (opened in binary mode) on
+    # the same directory, which then replaces the given path
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _check_entries(entries):
+    # Validates a chunk of dataset entries (array of shape (n, 2, 81)) and returns two
+    # SudokuBatch instances with the sudokus and their solutions
+    unsolved, solved = SudokuBatch(entries[:, 0]), SudokuBatch(entries[:, 1])
+
+    if not np.all(unsolved.valid & solved.valid):
+        raise ValueError('Invalid sudoku configuration found in dataset')
+
+    # The solved configurations are really the solutions to the unsolved configurations?
+    a, b = unsolved.values.reshape([-1, 81]), solved.values.reshape([-1, 81])
+    if not np.all(solved.full & (unsolved.empty_cells_count > 0) & np.all((a == 0) | (a == b), axis=1)):
+        raise ValueError('Invalid sudoku solution found in dataset')
+
+    return unsolved, solved
+
+
 if __name__ == '__main__':
-    dataset = Dataset()
+    dataset = SudokuDataset()
     quizz, solution = next(dataset.get_samples())
     print("Sudoku:\n")
     print(quizz)
@@ -0,0 +1,240 @@
+'''
+This module generates valid sudoku puzzles with a unique solution. Puzzles are created by
+filling a random grid and removing clues one by one (in random order) as long as the puzzle keeps
+a single solution. The number of clues and the difficulty of the puzzles can be chosen.
+
+The difficulty is measured by the techniques needed to solve the puzzle (check rate()):
+    - 'easy': Naked and hidden singles are enough
+    - 'medium': It also needs naked / hidden pairs and triples or pointing / box-line reductions
+    - 'hard': Constraint propagation gets stuck and search is required
+'''
+
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sudoku import Sudoku, SudokuBatch, POPCOUNT
+from symmetry import random_transform
+from solvers.dlxsolver import DLXSudokuSolver
+from solvers.propagationsolver import PropagationState
+
+
+# Difficulty levels (from easier to harder)
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+# Puzzles with less clues than this never have a unique solution
+MIN_CLUES = 17
+
+
+
+### Difficulty rating
+
+def _propagate(sudoku, singles_only):
+    # Applies constraint propagation on the sudoku (it is modified). Returns True if it gets solved
+    try:
+        state = PropagationState(sudoku, singles_only)
+        while True:
+            while state.singles:
+                state.place(*state.singles.popleft())
+            if not state.units:
+                break
+            unit = state.units.popleft()
+            state.pending_units[unit] = False
+            state.examine(unit)
+    except ValueError:
+        return False
+    return sudoku.full
+
+
+def rate(sudoku):
+    '''
+    Returns the difficulty of the given puzzle: 'easy' if it can be solved with naked and hidden
+    singles, 'medium' if it also needs the rest of techniques of PropagationSudokuSolver and 'hard'
+    if search is required (puzzles without solution or with several solutions are always 'hard').
+    The sudoku is not modified
+    '''
+    if _propagate(sudoku.copy(), singles_only=True):
+        return 'easy'
+    if _propagate(sudoku.copy(), singles_only=False):
+        return 'medium'
+    return 'hard'
+
+
+
+### Generator
+
+class SudokuGenerator:
+    '''
+    Generator of valid sudoku puzzles with a unique solution.
+    Each puzzle is generated with its own random number generator, seeded with the seed of the
+    generator and the index of the puzzle, so the same puzzles are returned regardless of the number
+    of processes used.
+    '''
+
+    def __init__(self, clues=None, difficulty=None, seed=None, max_attempts=100):
+        '''
+        Constructor.
+        :param clues: Number of clues of the puzzles. If None, clues are removed until no more
+        can be removed without losing the uniqueness of the solution (minimal puzzles). Puzzles
+        with few clues (less than 22 or so) are very hard to find
+        :param difficulty: One of 'easy', 'medium' or 'hard' or None to accept any difficulty
+        :param seed: Seed of the generator (an integer). If None, a random seed is chosen
+        :param max_attempts: Number of grids tried before giving up on a puzzle (raises ValueError)
+        '''
+        if clues is not None and not MIN_CLUES <= clues <= 81:
+            raise ValueError('Number of clues must be in the range [{}, 81]'.format(MIN_CLUES))
+        if difficulty is not None and difficulty not in DIFFICULTIES:
+            raise ValueError('Difficulty must be one of {}'.format(', '.join(DIFFICULTIES)))
+        assert max_attempts > 0
+
+        self.clues, self.difficulty, self.max_attempts = clues, difficulty, max_attempts
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self._solver = DLXSudokuSolver()
+
+
+    def solution(self, rng):
+        '''
+        Returns a random solved sudoku.
+        :param rng: A numpy Generator instance
+        '''
+        # The diagonal squares dont share any unit: fill them with random permutations and then
+        # complete the grid with the solver
+        sudoku = Sudoku()
+        for k in range(0, 3):
+            sudoku[k * 3:k * 3 + 3, k * 3:k * 3 + 3] = (rng.permutation(9) + 1).reshape([3, 3])
+        self._solver.solve(sudoku)
+        return random_transform(rng)(sudoku)
+
+
+    def _dig(self, solution, rng):
+        # Removes clues of the solution in random order. Returns the puzzle or None if it has not
+        # the number of clues or the difficulty requested
+        puzzle = solution.copy()
+        clues = 81
+        for k in rng.permutation(81):
+            if clues == self.clues:
+                break
+            i, j = divmod(int(k), 9)
+            num = puzzle[i, j].value
+            del puzzle[i, j]
+
+            if POPCOUNT[puzzle[i, j].remaining_numbers_mask] == 1:
+                # The number can be deduced from its peers (naked single), so the puzzle is as
+                # hard as before and its solution still unique
+                keep = True
+            elif self.difficulty in ('easy', 'medium'):
+                # Puzzles solved by propagation always have a unique solution
+                keep = DIFFICULTIES.index(rate(puzzle)) <= DIFFICULTIES.index(self.difficulty)
+            else:
+                keep = self._solver.count_solutions(puzzle, limit=2) == 1
+
+            if keep:
+                clues -= 1
+            else:
+                puzzle[i, j] = num
+
+        if self.clues is not None and clues != self.clues:
+            return None
+        if self.difficulty is not None and rate(puzzle) != self.difficulty:
+            return None
+        return puzzle
+
+
+    def generate(self, index=0):
+        '''
+        Generates a puzzle. Returns a tuple with the puzzle and its solution (Sudoku instances).
+        :param index: Index of the puzzle. Generating the same index with the same seed always
+        returns the same puzzle
+        '''
+        rng = np.random.default_rng([self.seed, index])
+        for attempt in range(0, self.max_attempts):
+            solution = self.solution(rng)
+            puzzle = self._dig(solution, rng)
+            if puzzle is not None:
+                return puzzle, solution
+        raise ValueError('Could not generate a puzzle with {} clues and {} difficulty'.format(
+            self.clues or 'any', self.difficulty or 'any'))
+
+
+    def generate_many(self, n, start=0, workers=1, chunksize=64):
+        '''
+        Generates the puzzles with indices start, start + 1, ..., start + n - 1. Returns an
+        iterator of tuples (puzzle, solution) in that order. Puzzles are generated lazily.
+
+        :param workers: Number of processes used. If its 1, puzzles are generated in the current process
+        :param chunksize: Number of puzzles generated by a worker at once
+        '''
+        assert n >= 0 and workers > 0
+        chunks = ((index, min(chunksize, start + n - index)) for index in range(start, start + n, chunksize))
+        if workers == 1:
+            for index, count in chunks:
+                for k in range(index, index + count):
+                    yield self.generate(k)
+            return
+
+        with ProcessPoolExecutor(workers) as executor:
+            # At most 2 * workers chunks are generated at the same time
+            pending = deque()
+            for index, count in chunks:
+                pending.append(executor.submit(_generate_chunk, self, index, count))
+                if len(pending) >= 2 * workers:
+                    yield from _unpack_chunk(*pending.popleft().result())
+            while pending:
+                yield from _unpack_chunk(*pending.popleft().result())
+
+
+    def generate_batch(self, n, start=0, workers=1, chunksize=64):
+        '''
+        Same as generate_many but returns two SudokuBatch instances with the puzzles and
+        their solutions
+        '''
+        return _collect(self.generate_many(n, start, workers, chunksize), n)
+
+
+    def write(self, file, n, format='lines', start=0, workers=1, chunksize=64, block_size=4096, **kwargs):
+        '''
+        Generates n puzzles and writes them to a file with sudokuio.SudokuWriter (the 'csv'
+        format also stores the solutions). Puzzles are written in blocks, so it can be used to
+        create very large files.
+        :param file: A path or a file object opened in binary mode
+        :param block_size: Number of puzzles written at once
+        :param kwargs: Extra arguments for SudokuWriter
+        '''
+        from sudokuio import SudokuWriter
+        pairs = self.generate_many(n, start, workers, chunksize)
+        with SudokuWriter(file, format, **kwargs) as writer:
+            for index in range(0, n, block_size):
+                puzzles, solutions = _collect(pairs, min(block_size, n - index))
+                writer.write(puzzles, solutions if format == 'csv' else None)
+
+
+
+def _collect(pairs, n):
+    # Takes n tuples (puzzle, solution) from the given iterator and stores them in two batches
+    puzzles, solutions = SudokuBatch.empty(n), SudokuBatch.empty(n)
+    for k, (puzzle, solution) in zip(range(0, n), pairs):
+        puzzles.values[k], solutions.values[k] = puzzle.values, solution.values
+    return puzzles, solutions
+
+
+def _generate_chunk(generator, index, count):
+    # Generates a chunk of puzzles (this is executed on the workers). Returns two uint8 arrays of
+    # shape (count, 81) with the puzzles and the solutions
+    puzzles, solutions = _collect((generator.generate(k) for k in range(index, index + count)), count)
+    return puzzles.values.reshape([count, 81]), solutions.values.reshape([count, 81])
+
+
+def _unpack_chunk(puzzles, solutions):
+    # Converts the arrays returned by _generate_chunk to tuples of sudokus
+    for k in range(0, len(puzzles)):
+        yield Sudoku.from_buffer(puzzles[k]), Sudoku.from_buffer(solutions[k])
+
+
+def generate(n=None, clues=None, difficulty=None, seed=None, workers=1):
+    '''
+    Generates puzzles with a unique solution (check SudokuGenerator). If n is None, returns a single
+    puzzle. Otherwise returns two SudokuBatch instances with n puzzles and their solutions
+    '''
+    generator = SudokuGenerator(clues, difficulty, seed)
+    if n is None:
+        return generator.generate()[0]
+    return generator.generate_batch(n, workers=workers)
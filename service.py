@@ -0,0 +1,497 @@
+'''
+This module puts the sudoku solvers behind an asyncio service. Puzzles are queued on a bounded
+queue, grouped in small batches and solved by a pool of processes, so the event loop is never
+blocked by the solvers.
+
+The service speaks newline-delimited JSON (over TCP or stdin / stdout). Each request is a line
+with a JSON object:
+
+    {"id": 1, "sudoku": "300006002798040000...", "timeout": 0.5}
+    {"id": 2, "op": "metrics"}
+
+id is optional and copied on the response, sudoku is a string of 81 numbers ('0' or '.' for
+blank cells) and timeout the number of seconds allowed since the request is received
+(including the time waiting on the queue). Responses are written as soon as they are ready (not
+necessarily in the same order):
+
+    {"id": 1, "solution": "372496152798...", "error": null, "elapsed": 0.0003, "latency": 0.004}
+    {"id": 2, "metrics": {"queue_depth": 0, ...}}
+
+error is null if it was solved or 'unsolved', 'invalid', 'timeout', 'bad request' or
+'internal error' (the solver failed unexpectedly).
+When the queue is full, the service stops reading new requests until there is room again
+(backpressure), so clients must not send requests faster than they read responses.
+
+Usage:
+
+    python service.py dlx --workers 4 --tcp 127.0.0.1:8765
+    python service.py dlx < puzzles.ndjson > solutions.ndjson
+'''
+
+import asyncio
+import json
+import math
+import multiprocessing
+import sys
+import numpy as np
+from argparse import ArgumentParser
+from collections import namedtuple, deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from time import monotonic
+from sudoku import Sudoku
+
+
+
+class ServiceResult(namedtuple('ServiceResult', ['solution', 'error', 'elapsed', 'latency'])):
+    '''
+    Result of a request to SudokuService: solution is the sudoku solved (None if it failed), error
+    is None if it was solved or 'unsolved', 'invalid' or 'timeout' (check SolveResult), elapsed is the
+    time spent by the solver and latency the time since the request was submitted until it finished
+    (in seconds)
+    '''
+    @property
+    def solved(self):
+        return self.error is None
+
+
+
+class ServiceOverloaded(Exception):
+    '''
+    Raised by SudokuService.submit when the queue is full and the request cannot wait
+    '''
+    pass
+
+
+
+class _Request:
+    # A puzzle waiting to be solved
+    __slots__ = ('values', 'deadline', 'future', 'submitted')
+
+    def __init__(self, values, deadline, future, submitted):
+        self.values, self.deadline, self.future, self.submitted = values, deadline, future, submitted
+
+
+
+class SudokuService:
+    '''
+    Asyncio service which solves sudokus with a pool of processes. Requests are stored on a bounded
+    queue and dispatched to the workers in batches of up to max_batch puzzles: when a puzzle
+    arrives, the service waits at most max_delay seconds for other puzzles before sending the batch.
+    At most 2 * workers batches are being solved at the same time.
+
+    It must be started before submitting requests. It can be used as an async context manager:
+
+    async with SudokuService('dlx', workers=4) as service:
+        result = await service.solve(sudoku, timeout=0.5)
+    '''
+
+    def __init__(self, solver='dlx', workers=1, max_batch=64, max_delay=0.002, max_queue=1024, timeout=None):
+        '''
+        Constructor.
+        :param solver: Name of the solver used (check benchmark.get_solver)
+        :param workers: Number of processes used to solve the sudokus
+        :param max_batch: Maximum number of puzzles sent to a worker at once
+        :param max_delay: Maximum number of seconds a puzzle waits for others to fill a batch
+        :param max_queue: Maximum number of puzzles waiting on the queue
+        :param timeout: Default number of seconds allowed for each request (None for no limit)
+        '''
+        assert workers > 0 and max_batch > 0 and max_delay >= 0 and max_queue > 0
+        _check_timeout(timeout)
+        from benchmark import get_solver
+        get_solver(solver)
+
+        self.solver, self.workers = solver, workers
+        self.max_batch, self.max_delay, self.max_queue = max_batch, max_delay, max_queue
+        self.timeout = timeout
+
+        self._queue = None
+        self._executor = None
+        self._batcher = None
+        self._batches = set()
+
+        # Metrics
+        self.requests = self.completed = self.batches = self.dispatched = self.in_flight = 0
+        self.errors = Counter()
+        self._latencies = deque(maxlen=10000)
+
+
+    async def start(self):
+        '''
+        Starts the pool of processes and the task which dispatches the batches
+        '''
+        if self._batcher is not None:
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(2 * self.workers)
+        self._executor = self._create_pool()
+        # The workers are started (and their solvers created) before serving any request
+        await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(self._executor, _get_solver, self.solver)
+                               for k in range(0, self.workers)))
+        self._batcher = asyncio.create_task(self._dispatch_batches())
+
+
+    def _create_pool(self):
+        # The workers are started by a fork server when its available: if they were forked from the
+        # service, they would inherit the sockets of the clients connected at that moment (which
+        # would not be closed until the pool stops)
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+
+
+    async def stop(self):
+        '''
+        Stops the service. Requests not finished yet are cancelled
+        '''
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(self._batcher, *self._batches, return_exceptions=True)
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._batcher = self._executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+
+    async def submit(self, sudoku, timeout=None, block=True):
+        '''
+        Adds a sudoku to the queue. Returns an asyncio future which will be set to a
+        ServiceResult instance. If the queue is full, it waits until there is room for it (or
+        raises ServiceOverloaded if block is False).
+        :param sudoku: A Sudoku instance or an array-like with 81 numbers
+        :param timeout: Number of seconds allowed to solve it since now (the timeout of the service
+        by default). Raises ValueError if its not a non negative finite number
+        '''
+        if self._batcher is None:
+            raise RuntimeError('The service is not running')
+        _check_timeout(timeout)
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        # Deadlines are measured with time.monotonic, which is shared with the worker processes
+        request = _Request(
+            np.asarray(getattr(sudoku, 'values', sudoku), dtype=np.uint8).reshape([81]),
+            monotonic() + timeout if timeout is not None else None, loop.create_future(), loop.time())
+
+        if block:
+            await self._queue.put(request)
+        else:
+            try:
+                self._queue.put_nowait(request)
+            except asyncio.QueueFull:
+                raise ServiceOverloaded('Too many requests waiting to be solved') from None
+        self.requests += 1
+        return request.future
+
+
+    async def solve(self, sudoku, timeout=None):
+        '''
+        Solves a sudoku. Returns a ServiceResult instance (check submit())
+        '''
+        return await (await self.submit(sudoku, timeout))
+
+
+    async def _dispatch_batches(self):
+        # Takes batches of requests from the queue and sends them to the workers
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch - 1 and self.max_delay > 0:
+                # Wait for more puzzles to fill the batch
+                await asyncio.sleep(self.max_delay)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            task = asyncio.create_task(self._solve_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+
+    async def _solve_batch(self, batch):
+        # Solves a batch of requests on the pool of processes
+        loop, executor = asyncio.get_running_loop(), self._executor
+        try:
+            now = monotonic()
+            pending = []
+            for request in batch:
+                if request.future.done():
+                    # Cancelled by the client
+                    continue
+                if request.deadline is not None and request.deadline <= now:
+                    self._finish(request, None, 'timeout', 0.0)
+                    continue
+                pending.append(request)
+            if not pending:
+                return
+
+            self.batches += 1
+            self.dispatched += len(pending)
+            self.in_flight += len(pending)
+            try:
+                values = np.stack([request.values for request in pending])
+                deadlines = [request.deadline for request in pending]
+                results = await loop.run_in_executor(executor, _solve_batch, self.solver, values, deadlines)
+            finally:
+                self.in_flight -= len(pending)
+
+            for request, (solution, error, elapsed) in zip(pending, results):
+                self._finish(request, Sudoku(solution.reshape([9, 9])) if solution is not None else None, error, elapsed)
+
+        except asyncio.CancelledError:
+            # The service was stopped
+            for request in batch:
+                request.future.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                # A worker died and the pool cant be used anymore: the next batches use a new one
+                executor.shutdown(wait=False)
+                self._executor = self._create_pool()
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+
+    def _finish(self, request, solution, error, elapsed):
+        # Sets the result of a request and updates the metrics
+        if request.future.done():
+            return
+        latency = asyncio.get_running_loop().time() - request.submitted
+        request.future.set_result(ServiceResult(solution, error, elapsed, latency))
+        self.completed += 1
+        if error is not None:
+            self.errors[error] += 1
+        self._latencies.append(latency)
+
+
+    def metrics(self):
+        '''
+        Returns a dictionary with the metrics of the service: queue_depth (number of puzzles waiting),
+        in_flight (puzzles being solved), requests, completed, errors (count of each error), batches,
+        mean_batch_size and the latency distribution (p50, p90, p99 and max in seconds) of the last
+        10000 requests finished
+        '''
+        latencies = np.array(self._latencies)
+        latency = None
+        if latencies.size > 0:
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist()
+            latency = dict(p50=p50, p90=p90, p99=p99, max=float(latencies.max()))
+        return dict(
+            queue_depth=self._queue.qsize() if self._queue is not None else 0, max_queue=self.max_queue,
+            in_flight=self.in_flight, requests=self.requests, completed=self.completed, errors=dict(self.errors),
+            batches=self.batches, mean_batch_size=self.dispatched / self.batches if self.batches else 0.0,
+            latency=latency)
+
+
+    ### Newline-delimited JSON protocol
+
+    async def handle_stream(self, reader, writer):
+        '''
+        Serves the requests read from an asyncio stream (one JSON object per line) and writes the
+        responses on the given writer (check the module docs)
+        '''
+        tasks = set()
+        lock = asyncio.Lock()
+
+        async def respond(response):
+            async with lock:
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+
+        async def reply(id, future):
+            try:
+                result = await future
+            except Exception as e:
+                await respond(dict(id=id, error='internal error', message=str(e)))
+                return
+            await respond(dict(
+                id=id, solution=''.join(map(str, result.solution.values.flatten().tolist())) if result.solved else None,
+                error=result.error, elapsed=result.elapsed, latency=result.latency))
+
+        try:
+            while True:
+                line = await _read_line(reader)
+                if not line:
+                    if line is None:
+                        await respond(dict(id=None, error='bad request', message='Request too long'))
+                        continue
+                    break
+                if not line.strip():
+                    continue
+
+                id = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('Requests must be JSON objects')
+                    id = request.get('id')
+                    if request.get('op') == 'metrics':
+                        await respond(dict(id=id, metrics=self.metrics()))
+                        continue
+                    sudoku = Sudoku.fromstring(str(request['sudoku']))
+                    timeout = request.get('timeout')
+                    _check_timeout(timeout)
+                except (ValueError, KeyError) as e:
+                    await respond(dict(id=id, error='bad request', message=str(e)))
+                    continue
+
+                # Waits if the queue is full (backpressure)
+                future = await self.submit(sudoku, timeout)
+                task = asyncio.create_task(reply(id, future))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+
+    async def serve_tcp(self, host='127.0.0.1', port=8765):
+        '''
+        Serves requests from TCP clients (one stream per connection). Returns an asyncio
+        Server instance
+        '''
+        return await asyncio.start_server(self.handle_stream, host, port)
+
+
+    async def serve_stdio(self):
+        '''
+        Serves the requests read from stdin and writes the responses on stdout until stdin is closed
+        '''
+        await self.handle_stream(_StdinReader(), _StdoutWriter())
+
+
+
+def _check_timeout(timeout):
+    # Raises ValueError if the timeout is not None or a non negative finite number
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                or not math.isfinite(timeout) or timeout < 0):
+        raise ValueError('timeout must be a non negative finite number')
+
+
+async def _read_line(reader):
+    # Returns the next line of the stream (b'' at the end) or None if it was longer than the limit
+    # of the reader (the whole line is skipped)
+    skipped = False
+    while True:
+        try:
+            line = await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            # Last line (without line break)
+            line = e.partial
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+            skipped = True
+            continue
+        return None if skipped else line
+
+
+
+class _StdinReader:
+    # Minimal stream reader which reads lines from stdin on a thread (it works with pipes, files
+    # and terminals)
+    async def readuntil(self, separator):
+        line = await asyncio.get_running_loop().run_in_executor(None, sys.stdin.buffer.readline)
+        if not line.endswith(separator):
+            raise asyncio.IncompleteReadError(line, None)
+        return line
+
+
+
+class _StdoutWriter:
+    # Minimal stream writer which writes on stdout
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+
+    async def drain(self):
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        sys.stdout.buffer.flush()
+
+
+
+### Helper functions executed on the workers
+
+@lru_cache(maxsize=None)
+def _get_solver(name):
+    # Each worker creates the solver once
+    from benchmark import get_solver
+    return get_solver(name)
+
+
+def _solve_batch(name, chunk, deadlines):
+    # Solves a batch of sudokus (array of shape (n, 81)). deadlines are the time.monotonic values
+    # at which each one expires (or None), so the time the batch waited on the pool is also counted.
+    # Returns a list of tuples (solution or None, error, elapsed time)
+    from solvers.solver import _solve_chunk
+    solver = _get_solver(name)
+    results = []
+    for values, deadline in zip(chunk, deadlines):
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                results.append((None, 'timeout', 0.0))
+                continue
+        solution, error, elapsed, stats = _solve_chunk(
+            solver, values[np.newaxis], {'timeout': timeout} if timeout is not None else {})[0]
+        results.append((solution, error, elapsed))
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Asyncio service which solves sudokus (newline-delimited JSON)')
+    parser.add_argument('solver', type=str, nargs='?', default='dlx')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to solve the sudokus')
+    parser.add_argument('--tcp', type=str, default=None, help='Listen on this address (host:port) instead of stdin')
+    parser.add_argument('--max-batch', type=int, default=64, help='Maximum number of puzzles sent to a worker at once')
+    parser.add_argument('--max-delay', type=float, default=0.002, help='Maximum seconds waiting to fill a batch')
+    parser.add_argument('--max-queue', type=int, default=1024, help='Maximum number of puzzles waiting')
+    parser.add_argument('--timeout', type=float, default=None, help='Default seconds allowed for each request')
+
+    parsed_args = parser.parse_args()
+
+    for name in ('workers', 'max_batch', 'max_queue'):
+        if getattr(parsed_args, name) <= 0:
+            parser.error('{} argument must be a positive number'.format(name.replace('_', '-')))
+    if parsed_args.max_delay < 0:
+        parser.error('max-delay argument must be a non negative number')
+    if parsed_args.timeout is not None and not 0 <= parsed_args.timeout < float('inf'):
+        parser.error('timeout argument must be a non negative finite number')
+
+    try:
+        service = SudokuService(parsed_args.solver, parsed_args.workers, parsed_args.max_batch, parsed_args.max_delay,
+                                parsed_args.max_queue, parsed_args.timeout)
+    except:
+        parser.error('"{}" is not a valid sudoku algorithm'.format(parsed_args.solver))
+
+    async def main():
+        async with service:
+            if parsed_args.tcp is None:
+                await service.serve_stdio()
+                return
+            host, port = parsed_args.tcp.rsplit(':', 1)
+            server = await service.serve_tcp(host, int(port))
+            print('Listening on {}'.format(parsed_args.tcp), file=sys.stderr)
+            async with server:
+                await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
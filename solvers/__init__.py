@@ -1,4 +1,8 @@
 
 
-from .solver import SudokuSolver, SudokuIterativeSolver, BasicSudokuIterativeSolver
-from .deepsearchsolver import DeepSearchSudokuSolver
+from .solver import SudokuSolver, SudokuIterativeSolver, BasicSudokuIterativeSolver, SolveTimeout, SolveBudget
+from .deepsearchsolver import DeepSearchSudokuSolver, TrailDeepSearchSudokuSolver
+from .dlxsolver import DLXSudokuSolver, count_solutions, count_solutions_many, is_unique
+from .propagationsolver import PropagationSudokuSolver
+from .cachedsolver import CachedSudokuSolver
+from .stats import SolverStats, instrument
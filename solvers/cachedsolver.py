@@ -0,0 +1,86 @@
+from collections import OrderedDict, namedtuple
+import numpy as np
+from sudoku import Sudoku
+from symmetry import minlex_canonical_form
+from solvers.solver import SudokuSolver
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+
+class CachedSudokuSolver(SudokuSolver):
+    '''
+    Sudoku solver which wraps another solver and keeps the solutions of the last sudokus solved
+    in a LRU cache. Sudokus are stored in their canonical form (check Sudoku.canonical()), so that
+    all the sudokus which are equivalent under the symmetries of the sudoku share the same entry:
+    the solution is found in the canonical space and mapped back with the inverse transformation.
+
+    Each entry takes 162 bytes (the canonical sudoku and its solution) plus the overhead of the
+    python objects. The cache is not shared between processes (each worker used by solve_many
+    starts with an empty cache)
+    '''
+
+    def __init__(self, solver=None, maxsize=4096):
+        '''
+        Constructor.
+        :param solver: The solver used when the sudoku is not in the cache (DLXSudokuSolver by default)
+        :param maxsize: Maximum number of entries on the cache
+        '''
+        assert maxsize > 0
+        if solver is None:
+            from solvers.dlxsolver import DLXSudokuSolver
+            solver = DLXSudokuSolver()
+        self.solver, self.maxsize = solver, maxsize
+        self._cache = OrderedDict()
+        self.hits = self.misses = 0
+
+
+    def solve(self, sudoku, timeout=None, max_nodes=None):
+        '''
+        Solves the sudoku. If it has no solution, raises ValueError (unsolvable sudokus are not
+        cached). The limits are shared with the solver used when its not in the cache. The time
+        limit also covers the computation of the canonical form, but its only checked once its done
+        (it can take up to 0.2s on sudokus with very few clues)
+        '''
+        with self.limits(timeout, max_nodes):
+            canonical, transform = minlex_canonical_form(sudoku)
+            if self.budget is not None:
+                self.budget.check()
+            key = canonical.tobytes()
+            solution = self._cache.get(key)
+
+            if solution is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            else:
+                self.misses += 1
+                canonical = Sudoku.from_buffer(canonical)
+                # The statistics and the limits of the solver used are the ones of this solver
+                stats, budget = self.solver.stats, self.solver.budget
+                self.solver.stats, self.solver.budget = self.stats, self.budget
+                try:
+                    self.solver.solve(canonical)
+                finally:
+                    self.solver.stats, self.solver.budget = stats, budget
+                solution = self._cache[key] = canonical.to_bytes()
+                if len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+
+        sudoku[:, :] = transform.inverse().apply(np.frombuffer(solution, dtype=np.uint8))
+
+
+    def cache_info(self):
+        '''
+        Returns the number of hits and misses and the current and maximum number of entries
+        of the cache (as a CacheInfo namedtuple, like functools.lru_cache)
+        '''
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._cache))
+
+
+    def cache_clear(self):
+        '''
+        Removes all the entries of the cache and resets its statistics
+        '''
+        self._cache.clear()
+        self.hits = self.misses = 0
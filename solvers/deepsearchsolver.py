@@ -1,8 +1,9 @@
 
 import numpy as np
-from itertools import product, takewhile, chain
+from itertools import product, takewhile, chain, islice
 from functools import lru_cache
 from solvers.solver import SudokuSolver
+from sudoku import PEERS, POPCOUNT
 import collections.abc
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
@@ -11,17 +12,111 @@ from operator import itemgetter
 
 
 
+class MRVQueue:
+    '''
+    Bucket queue which indexes the empty cells of a sudoku by their number of remaining numbers
+    (minimum remaining values heuristic). It must be notified whenever a cell is filled or cleared
+    (via assign() and unassign()) and only the neighbours of that cell are updated.
+    It also keeps the degree of each cell (number of empty neighbours) to break ties.
+    '''
+    def __init__(self, sudoku):
+        self.cells = list(sudoku.flatten())
+        # buckets[n] are the indices of the empty cells with n remaining numbers
+        self.buckets = [set() for n in range(0, 10)]
+        # Number of remaining numbers of each cell (None for filled cells)
+        self.counts = [None] * 81
+        self.degrees = [0] * 81
+
+        for k, cell in enumerate(self.cells):
+            if cell.empty:
+                self.counts[k] = POPCOUNT[cell.remaining_numbers_mask]
+                self.buckets[self.counts[k]].add(k)
+            self.degrees[k] = sum(1 for peer in PEERS[k] if self.cells[peer].empty)
+
+
+    def update(self, k):
+        # Update the number of remaining numbers of the kth cell
+        prev = self.counts[k]
+        if prev is None:
+            return
+        count = POPCOUNT[self.cells[k].remaining_numbers_mask]
+        if count != prev:
+            self.buckets[prev].discard(k)
+            self.buckets[count].add(k)
+            self.counts[k] = count
+
+
+    def assign(self, k):
+        '''
+        Must be called after filling the kth cell
+        '''
+        self.buckets[self.counts[k]].discard(k)
+        self.counts[k] = None
+        for peer in PEERS[k]:
+            self.degrees[peer] -= 1
+            self.update(peer)
+
+
+    def unassign(self, k):
+        '''
+        Must be called after clearing the kth cell
+        '''
+        self.counts[k] = POPCOUNT[self.cells[k].remaining_numbers_mask]
+        self.buckets[self.counts[k]].add(k)
+        for peer in PEERS[k]:
+            self.degrees[peer] += 1
+            self.update(peer)
+
+
+    def min(self, degree_tie_breaking=False):
+        '''
+        Returns an empty cell with the minimum number of remaining numbers (at least 1) or None
+        if there are no such cells.
+        :param degree_tie_breaking: If True, among those cells, the one with more empty neighbours
+        is returned
+        '''
+        for bucket in islice(self.buckets, 1, None):
+            if bucket:
+                if degree_tie_breaking:
+                    return self.cells[max(bucket, key=self.degrees.__getitem__)]
+                return self.cells[next(iter(bucket))]
+        return None
+
+
+
+
 class DeepSearchSudokuSolver(SudokuSolver):
+    '''
+    Sudoku solver which performs a deep search: On each node, it chooses the empty cell with
+    less remaining numbers and tries all of them (backtracking if they lead to invalid
+    configurations)
+    '''
+
+    def __init__(self, degree_tie_breaking=False):
+        '''
+        Constructor.
+        :param degree_tie_breaking: If True, when several cells have the minimum number of remaining
+        numbers, the one with more empty neighbours is expanded first
+        '''
+        self.degree_tie_breaking = degree_tie_breaking
+
 
-    def expand_node(self, sudoku, cell):
+    def expand_node(self, sudoku, cell, queue=None):
         # Expand a node
         assert cell.empty and cell.valid
+        stats, budget = self.stats, self.budget
 
         # For each value that we can put in the cell.
         for num in cell.remaining_numbers:
+            if stats is not None:
+                stats.nodes += 1
+            if budget is not None:
+                budget.spend()
             try:
                 # Set the cell's value
                 cell.value = num
+                if queue is not None:
+                    queue.assign(cell.index)
                 yield cell
 
                 # All empty cells in its neightbourhood (row, column or square) still valid?
@@ -31,12 +126,16 @@ class DeepSearchSudokuSolver(SudokuSolver):
 
 
                 # Call solve() recursively until complete the sudoku
-                yield from self.solve_iterator(sudoku)
+                yield from self.solve_iterator(sudoku, queue)
                 return
             except ValueError:
                 # Remove node branch (cell cannot have this value because it only leads to
                 # invalid configurations). Test other branches
+                if stats is not None:
+                    stats.backtracks += 1
                 del cell.value
+                if queue is not None:
+                    queue.unassign(cell.index)
                 yield cell
 
 
@@ -44,10 +143,13 @@ class DeepSearchSudokuSolver(SudokuSolver):
         raise ValueError()
 
 
-    def next_node(self, sudoku):
+    def next_node(self, sudoku, queue=None):
         # Find the next node
         assert sudoku.valid and not sudoku.full
 
+        if queue is not None:
+            return queue.min(self.degree_tie_breaking)
+
         for k in range(1, 10):
             # Search an empty cell where we can put k numbers
             for cell in sudoku.empty_cells:
@@ -55,7 +157,7 @@ class DeepSearchSudokuSolver(SudokuSolver):
                      return cell
 
 
-    def solve_iterator(self, sudoku):
+    def solve_iterator(self, sudoku, queue=None):
         '''
         This method solves the sudoku. Its like solve() but it returns a iterator
         object. Whenever this algorithm makes a change to any of the sudoku cells,
@@ -63,6 +165,9 @@ class DeepSearchSudokuSolver(SudokuSolver):
 
         When the sudoku is fully solved, the next call to __next__ raises StopIteration
         exception. If the sudoku couldnt be solved, raises ValueError instead
+
+        :param queue: MRVQueue used to select the next cell to expand. If not specified,
+        a new one is created for the sudoku
         '''
 
         # Sudoku must be a valid configuration
@@ -71,22 +176,26 @@ class DeepSearchSudokuSolver(SudokuSolver):
         if sudoku.full:
             # Nothing to be done, already solved
             return
+        if queue is None:
+            queue = MRVQueue(sudoku)
+
         # Find the next node and expand it
-        cell = self.next_node(sudoku)
-        yield from self.expand_node(sudoku, cell)
+        cell = self.next_node(sudoku, queue)
+        yield from self.expand_node(sudoku, cell, queue)
 
 
-    def solve(self, sudoku):
+    def solve(self, sudoku, timeout=None, max_nodes=None):
         '''
         Solves the sudoku. If the algorithm couldnt solve it, raise ValueError
-        exception
+        exception (or SolveTimeout if any of the limits is exceeded, check SudokuSolver.solve)
         '''
-        try:
-            it = self.solve_iterator(sudoku)
-            while True:
-                next(it)
-        except StopIteration:
-            pass
+        with self.limits(timeout, max_nodes):
+            try:
+                it = self.solve_iterator(sudoku)
+                while True:
+                    next(it)
+            except StopIteration:
+                pass
 
 
 
@@ -179,3 +288,86 @@ class DeepSearchSudokuSolver(SudokuSolver):
     def show_solve_animation(self, *args, **kwargs):
         anim = self.solve_animation(*args, **kwargs)
         plt.show()
+
+
+
+
+class TrailDeepSearchSudokuSolver(DeepSearchSudokuSolver):
+    '''
+    Same as DeepSearchSudokuSolver but the search is driven by an explicit stack of decisions
+    instead of recursive generators. The cells modified after each decision (the cell chosen and
+    the cells which only had one remaining number left after it) are recorded on a trail, so
+    backtracking only needs to clear those cells.
+    '''
+
+    def propagate(self, cells, trail, queue, k):
+        # Called after assigning a number to the kth cell. Fills the neighbour cells with only one
+        # remaining number (recursively) and records them on the trail. Returns False if
+        # any empty neighbour has no remaining numbers left
+        pending = [k]
+        while pending:
+            for peer in PEERS[pending.pop()]:
+                cell = cells[peer]
+                if not cell.empty:
+                    continue
+                mask = cell.remaining_numbers_mask
+                if mask == 0:
+                    return False
+                if POPCOUNT[mask] == 1:
+                    cell.value = mask.bit_length() - 1
+                    queue.assign(peer)
+                    trail.append(peer)
+                    pending.append(peer)
+                    yield cell
+        return True
+
+
+    def solve_iterator(self, sudoku):
+        assert sudoku.valid
+
+        queue = MRVQueue(sudoku)
+        cells = queue.cells
+        # Indices of the cells filled since the search started
+        trail = []
+        # Each item is a decision: [index of the cell, numbers not tried yet (bitmask), trail length
+        # before the decision]
+        stack = []
+        stats, budget = self.stats, self.budget
+
+        while not sudoku.full:
+            cell = self.next_node(sudoku, queue)
+            stack.append([cell.index, cell.remaining_numbers_mask, len(trail)])
+
+            while True:
+                decision = stack[-1]
+                if stats is not None and len(trail) > decision[2]:
+                    stats.backtracks += 1
+                # Undo the changes made since the decision
+                while len(trail) > decision[2]:
+                    cell = cells[trail.pop()]
+                    del cell.value
+                    queue.unassign(cell.index)
+                    yield cell
+
+                if decision[1] == 0:
+                    # All branches lead to invalid configurations. Do backtracking
+                    stack.pop()
+                    if not stack:
+                        raise ValueError()
+                    continue
+
+                # Try the next number
+                if stats is not None:
+                    stats.nodes += 1
+                if budget is not None:
+                    budget.spend()
+                bit = decision[1] & -decision[1]
+                decision[1] ^= bit
+                cell = cells[decision[0]]
+                cell.value = bit.bit_length() - 1
+                queue.assign(decision[0])
+                trail.append(decision[0])
+                yield cell
+
+                if (yield from self.propagate(cells, trail, queue, decision[0])):
+                    break
@@ -0,0 +1,260 @@
+import numpy as np
+from functools import lru_cache
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sudoku import Sudoku
+from solvers.solver import SudokuSolver, _chunks
+
+
+
+### Helper functions
+
+# The sudoku is modelled as an exact cover problem with 324 columns (constraints):
+#   - columns 0-80: cell k has a number
+#   - columns 81-161: row i has the number n
+#   - columns 162-242: column j has the number n
+#   - columns 243-323: square s has the number n
+# and 729 rows (candidates), one for each cell and number: row r = k * 9 + (n - 1)
+# Each row covers exactly 4 columns.
+
+def _candidate_columns(r):
+    # Returns the indices of the columns covered by the given row (candidate)
+    k, n = divmod(r, 9)
+    i, j = divmod(k, 9)
+    s = (i // 3) * 3 + j // 3
+    return k, 81 + i * 9 + n, 162 + j * 9 + n, 243 + s * 9 + n
+
+
+@lru_cache(maxsize=1)
+def _build_links():
+    '''
+    Builds the dancing links structure of the sudoku exact cover problem. Its stored in
+    flat lists (instead of node objects) where each node is identified by an integer:
+    node 0 is the root, nodes 1-324 are the column headers and the rest are the 729 * 4
+    nodes of the candidates.
+
+    :return Returns a tuple (left, right, up, down, column, row, size) where left, right, up
+    and down are the links between the nodes, column and row are the column header and the
+    row index of each node and size is the number of nodes of each column header
+    '''
+    n = 1 + 324 + 729 * 4
+    left, right, up, down = list(range(n)), list(range(n)), list(range(n)), list(range(n))
+    column, row, size = [0] * n, [-1] * n, [0] * n
+
+    # Column headers
+    for c in range(0, 325):
+        left[c], right[c] = (c - 1) % 325, (c + 1) % 325
+        column[c] = c
+
+    node = 325
+    for r in range(0, 729):
+        first = node
+        for c in _candidate_columns(r):
+            c += 1
+            # Insert the node at the bottom of the column
+            up[node], down[node] = up[c], c
+            down[up[c]] = node
+            up[c] = node
+            column[node], row[node] = c, r
+            size[c] += 1
+            node += 1
+
+        # Link the 4 nodes of the row circularly
+        for i in range(0, 4):
+            left[first + i], right[first + i] = first + (i - 1) % 4, first + (i + 1) % 4
+
+    return left, right, up, down, column, row, size
+
+
+
+### Solver
+
+class DLXSudokuSolver(SudokuSolver):
+    '''
+    Sudoku solver which uses the Knuth's Algorithm X with dancing links (DLX) over the
+    exact cover representation of the sudoku (324 constraints and 729 candidates).
+    '''
+
+    def search(self, sudoku):
+        '''
+        Returns an iterator which yields all the solutions of the given sudoku (as lists of 81
+        numbers, the values of the cells in row-major order). The sudoku is not modified.
+        If the numbers on the sudoku are in conflict, the iterator doesnt yield anything
+        '''
+        left, right, up, down, column, row, size = map(list, _build_links())
+
+        def cover(c):
+            left[right[c]], right[left[c]] = left[c], right[c]
+            i = down[c]
+            while i != c:
+                j = right[i]
+                while j != i:
+                    up[down[j]], down[up[j]] = up[j], down[j]
+                    size[column[j]] -= 1
+                    j = right[j]
+                i = down[i]
+
+        def uncover(c):
+            i = up[c]
+            while i != c:
+                j = left[i]
+                while j != i:
+                    size[column[j]] += 1
+                    up[down[j]] = down[up[j]] = j
+                    j = left[j]
+                i = up[i]
+            left[right[c]] = right[left[c]] = c
+
+        # Cover the columns of the numbers already placed on the sudoku
+        solution = [0] * 81
+        covered = [False] * 325
+        for k, num in enumerate(sudoku.to_bytes()):
+            if num == 0:
+                continue
+            solution[k] = num
+            for c in _candidate_columns(k * 9 + num - 1):
+                if covered[c + 1]:
+                    # Two numbers in conflict
+                    return
+                covered[c + 1] = True
+                cover(c + 1)
+
+        # Algorithm X (iterative version). chosen is the stack of rows selected
+        chosen = []
+        stats, budget = self.stats, self.budget
+        while True:
+            if right[0] == 0:
+                # All the constraints are satisfied
+                for i in chosen:
+                    k, n = divmod(row[i], 9)
+                    solution[k] = n + 1
+                yield list(solution)
+                i = None
+            else:
+                # Choose the column with less candidates
+                c, j, m = 0, right[0], 10
+                while j != 0:
+                    if size[j] < m:
+                        c, m = j, size[j]
+                        if m <= 1:
+                            break
+                    j = right[j]
+
+                cover(c)
+                i = down[c]
+                if i == c:
+                    uncover(c)
+                    i = None
+
+            if i is None:
+                # Backtracking: try the next row of the last column chosen
+                while chosen:
+                    i = chosen.pop()
+                    if stats is not None:
+                        stats.backtracks += 1
+                    c = column[i]
+                    j = left[i]
+                    while j != i:
+                        uncover(column[j])
+                        j = left[j]
+                    i = down[i]
+                    if i != c:
+                        break
+                    uncover(c)
+                else:
+                    # No more solutions
+                    return
+
+            # Select the row
+            if stats is not None:
+                stats.nodes += 1
+            if budget is not None:
+                budget.spend()
+            chosen.append(i)
+            j = right[i]
+            while j != i:
+                cover(column[j])
+                j = right[j]
+
+
+    def solve(self, sudoku, timeout=None, max_nodes=None):
+        '''
+        Solves the sudoku. If it has no solution, raises ValueError (or SolveTimeout if
+        any of the limits is exceeded, check SudokuSolver.solve)
+        '''
+        assert sudoku.valid
+
+        with self.limits(timeout, max_nodes):
+            solution = next(self.search(sudoku), None)
+        if solution is None:
+            raise ValueError()
+        sudoku[:, :] = np.array(solution, dtype=np.uint8).reshape([9, 9])
+
+
+    def count_solutions(self, sudoku, limit=2):
+        '''
+        Counts the solutions of the given sudoku. The search stops as soon as limit solutions are
+        found, so it returns min(number of solutions, limit). If limit is None, all the solutions
+        are counted
+        '''
+        assert limit is None or limit > 0
+        return sum(1 for solution in islice(self.search(sudoku), limit))
+
+
+    def is_unique(self, sudoku):
+        '''
+        Returns True if the given sudoku has exactly one solution
+        '''
+        return self.count_solutions(sudoku, limit=2) == 1
+
+
+
+### Solution counting
+
+def count_solutions(sudoku, limit=2):
+    '''
+    Counts the solutions of the given sudoku, stopping as soon as limit solutions are found
+    (check DLXSudokuSolver.count_solutions)
+    '''
+    return DLXSudokuSolver().count_solutions(sudoku, limit)
+
+
+def is_unique(sudoku):
+    '''
+    Returns True if the given sudoku has exactly one solution
+    '''
+    return DLXSudokuSolver().is_unique(sudoku)
+
+
+def count_solutions_many(sudokus, limit=2, workers=1, chunksize=256):
+    '''
+    Counts the solutions of a stream of sudokus. Returns an iterator with the number of solutions of
+    each one (at most limit) in the same order. The input is consumed lazily.
+
+    :param sudokus: An iterable of Sudoku instances or array-like objects with 81 numbers
+    :param workers: Number of processes used. If its 1, the solutions are counted in the current process
+    :param chunksize: Number of sudokus sent to a worker at once
+    '''
+    assert workers > 0
+    chunks = (chunk for start, chunk in _chunks(sudokus, chunksize))
+    if workers == 1:
+        for chunk in chunks:
+            yield from _count_chunk(chunk, limit)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        # At most 2 * workers chunks are sent to the workers at the same time
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_count_chunk, chunk, limit))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _count_chunk(chunk, limit):
+    # Counts the solutions of a chunk of sudokus (array of shape (n, 81))
+    solver = DLXSudokuSolver()
+    return [solver.count_solutions(Sudoku.from_buffer(values), limit) for values in chunk]
@@ -0,0 +1,202 @@
+from itertools import combinations
+from collections import deque
+from sudoku import CELL_UNITS, UNITS, PEERS, POPCOUNT, MASK_NUMBERS
+from solvers.solver import SudokuIterativeSolver
+
+
+
+# Cells of each unit (as lists of python integers)
+UNITS_CELLS = UNITS.tolist()
+
+# Masks with a single bit set, indexed by number (or position inside a unit)
+BITS = tuple(1 << i for i in range(0, 10))
+
+
+
+class PropagationState:
+    '''
+    Instances of this class store the state of the propagation algorithm for a specific sudoku:
+    The candidates of each cell (as bitmasks), the units that must be examined again and the
+    numbers that were deduced but not placed yet.
+    If singles_only is True, only naked and hidden singles are applied
+    '''
+    def __init__(self, sudoku, singles_only=False):
+        self.sudoku = sudoku
+        self.singles_only = singles_only
+        self.cells = list(sudoku.to_bytes())
+        self.candidates = [0] * 81
+        self.units = deque(range(0, 27))
+        self.pending_units = [True] * 27
+        self.singles = deque()
+
+        for k, cell in enumerate(sudoku.flatten()):
+            if self.cells[k] == 0:
+                self.candidates[k] = cell.remaining_numbers_mask
+                if self.candidates[k] == 0:
+                    raise ValueError()
+                if POPCOUNT[self.candidates[k]] == 1:
+                    self.singles.append((k, self.candidates[k]))
+        self.snapshot = sudoku.to_bytes()
+
+
+    def touch(self, k):
+        # The candidates of the kth cell changed: its units must be examined again
+        for unit in CELL_UNITS[k]:
+            if not self.pending_units[unit]:
+                self.pending_units[unit] = True
+                self.units.append(unit)
+
+
+    def eliminate(self, k, mask):
+        '''
+        Removes the numbers in the given mask from the candidates of the kth cell.
+        Raises ValueError if the cell has no candidates left
+        '''
+        candidates = self.candidates[k]
+        if self.cells[k] != 0 or candidates & mask == 0:
+            return
+        candidates &= ~mask
+        self.candidates[k] = candidates
+        if candidates == 0:
+            raise ValueError()
+        if POPCOUNT[candidates] == 1:
+            # Naked single
+            self.singles.append((k, candidates))
+        self.touch(k)
+
+
+    def restrict(self, k, mask):
+        # Removes from the candidates of the kth cell all the numbers which are not in the given mask
+        self.eliminate(k, ~mask & self.candidates[k])
+
+
+    def place(self, k, bit):
+        '''
+        Assigns a number to the kth cell (bit is the number as a bitmask).
+        Returns True if it was placed or False if the cell was already filled
+        '''
+        if self.cells[k] != 0:
+            return False
+        if self.candidates[k] & bit == 0:
+            raise ValueError()
+
+        num = bit.bit_length() - 1
+        self.cells[k] = num
+        self.candidates[k] = 0
+        self.sudoku[k // 9, k % 9] = num
+        self.snapshot = self.sudoku.to_bytes()
+
+        self.touch(k)
+        for peer in PEERS[k]:
+            self.eliminate(peer, bit)
+        return True
+
+
+    def examine(self, unit):
+        '''
+        Applies hidden singles, naked and hidden pairs and triples and pointing / box-line
+        reductions on the given unit
+        '''
+        cells = [k for k in UNITS_CELLS[unit] if self.cells[k] == 0]
+        if not cells:
+            return
+        candidates = self.candidates
+
+        # Positions inside the unit where each number can be placed (as bitmasks)
+        positions = [0] * 10
+        placed = 0
+        for k in UNITS_CELLS[unit]:
+            if self.cells[k] != 0:
+                placed |= BITS[self.cells[k]]
+        for i, k in enumerate(cells):
+            for num in MASK_NUMBERS[candidates[k]]:
+                positions[num] |= BITS[i]
+        numbers = [num for num in range(1, 10) if not placed & BITS[num]]
+
+        for num in numbers:
+            if positions[num] == 0:
+                # This number cannot be placed anywhere in the unit
+                raise ValueError()
+            if POPCOUNT[positions[num]] == 1:
+                # Hidden single
+                self.singles.append((cells[positions[num].bit_length() - 1], BITS[num]))
+
+        if self.singles_only:
+            return
+
+        for size in (2, 3):
+            if len(cells) <= size:
+                break
+
+            # Naked subsets: size cells whose candidates contain only size numbers
+            for subset in combinations([k for k in cells if POPCOUNT[candidates[k]] <= size], size):
+                mask = 0
+                for k in subset:
+                    mask |= candidates[k]
+                if POPCOUNT[mask] == size:
+                    for k in cells:
+                        if k not in subset:
+                            self.eliminate(k, mask)
+
+            # Hidden subsets: size numbers which can only be placed on size cells
+            for subset in combinations([num for num in numbers if POPCOUNT[positions[num]] <= size], size):
+                mask, where = 0, 0
+                for num in subset:
+                    mask |= BITS[num]
+                    where |= positions[num]
+                if POPCOUNT[where] == size:
+                    for i, k in enumerate(cells):
+                        if where & BITS[i]:
+                            self.restrict(k, mask)
+
+        # Pointing (square units) and box-line reduction (row and column units): if all the
+        # positions of a number inside this unit are also in another unit, the number cannot
+        # be placed on the rest of cells of that other unit
+        for num in numbers:
+            where = [cells[i] for i in range(0, len(cells)) if positions[num] & BITS[i]]
+            if len(where) < 2 or len(where) > 3:
+                continue
+            for other in set.intersection(*[set(CELL_UNITS[k]) for k in where]) - {unit}:
+                for k in UNITS_CELLS[other]:
+                    if k not in where:
+                        self.eliminate(k, BITS[num])
+
+
+
+class PropagationSudokuSolver(SudokuIterativeSolver):
+    '''
+    Iterative sudoku solver based on constraint propagation. It keeps the candidates of every cell
+    and a worklist of units to be examined (only the units affected by a change are examined
+    again). The next techniques are applied: naked and hidden singles, naked and hidden pairs and
+    triples and pointing / box-line reduction.
+    On each step, it assigns a number to one cell. If no deduction can be made, raises ValueError
+    '''
+
+    def __init__(self):
+        self._state = None
+
+
+    def step(self, sudoku):
+        state = self._state
+        if state is None or state.sudoku is not sudoku or state.snapshot != sudoku.to_bytes():
+            # A new sudoku or it was modified since the last step
+            state = self._state = PropagationState(sudoku)
+
+        try:
+            while True:
+                # Place the numbers already deduced
+                while state.singles:
+                    k, bit = state.singles.popleft()
+                    if state.place(k, bit):
+                        return
+
+                if not state.units:
+                    # Cant put any number
+                    raise ValueError()
+
+                unit = state.units.popleft()
+                state.pending_units[unit] = False
+                state.examine(unit)
+        except ValueError:
+            self._state = None
+            raise
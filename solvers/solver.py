@@ -1,86 +1,311 @@
 
 
 from sudoku import Sudoku
-from time import time
-from itertools import product, islice
+from time import perf_counter_ns
+from itertools import product, islice, chain
+from collections import namedtuple, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from visualization import SudokuPlot
+from solvers.stats import SolverStats, instrument
+
+
+class SolveResult(namedtuple('SolveResult', ['index', 'sudoku', 'solution', 'error', 'elapsed', 'stats'],
+                             defaults=(None,))):
+    '''
+    Result of solving a sudoku with SudokuSolver.solve_many:
+    index is the position of the sudoku in the input stream, sudoku is the configuration to be
+    solved and solution the configuration returned by the solver (None if it failed).
+    error is None if it was solved, 'unsolved' if the solver couldnt solve it (raised ValueError),
+    'invalid' if the configuration was invalid (raised AssertionError) or 'timeout' if the time or
+    nodes limit was reached (raised SolveTimeout).
+    elapsed is the time spent solving it (in seconds).
+    stats is a dictionary with the counters of SolverStats collected while solving it (None if the
+    solver had statistics disabled)
+    '''
+    @property
+    def solved(self):
+        return self.error is None
+
+
+
+
+class SolveTimeout(Exception):
+    '''
+    Raised by SudokuSolver.solve when the time or the number of nodes allowed to solve a sudoku
+    is exceeded (the sudoku is left partially filled)
+    '''
+    pass
+
+
+
+class SolveBudget:
+    '''
+    Limits of the time and the number of search nodes to solve a sudoku. Solvers call spend() on each
+    node of their search loop (cooperative cancellation)
+    '''
+    __slots__ = ('deadline', 'nodes_left')
+
+    def __init__(self, timeout=None, max_nodes=None):
+        '''
+        Constructor.
+        :param timeout: Maximum number of seconds (None or infinity for no limit)
+        :param max_nodes: Maximum number of search nodes (None for no limit)
+        Raises ValueError if any of the limits is negative (or NaN)
+        '''
+        if timeout is not None and not timeout >= 0:
+            raise ValueError('timeout must be a non negative number')
+        if max_nodes is not None and not max_nodes >= 0:
+            raise ValueError('max_nodes must be a non negative number')
+        if timeout == float('inf'):
+            timeout = None
+        self.deadline = perf_counter_ns() + int(timeout * 1e9) if timeout is not None else None
+        self.nodes_left = max_nodes
+
+
+    def spend(self):
+        '''
+        Must be called on each node of the search. Raises SolveTimeout if any of the limits is exceeded
+        '''
+        if self.nodes_left is not None:
+            self.nodes_left -= 1
+            if self.nodes_left < 0:
+                raise SolveTimeout('Maximum number of nodes exceeded')
+        self.check()
+
+
+    def check(self):
+        '''
+        Raises SolveTimeout if the time limit is exceeded (without spending a node). Used after
+        work done outside the search loop
+        '''
+        if self.deadline is not None and perf_counter_ns() > self.deadline:
+            raise SolveTimeout('Time limit exceeded')
+
+
 
 
 class SudokuSolver:
     '''
     Its the base class for all sudoku algorithm solvers
     '''
-    def solve(self, sudoku: Sudoku):
+
+    # Statistics collected by the solver (a SolverStats instance) or None if they are disabled
+    stats = None
+
+    # Limits of the sudoku being solved (a SolveBudget instance) or None
+    budget = None
+
+    def solve(self, sudoku: Sudoku, timeout=None, max_nodes=None):
         '''
         This method must try to solve the given sudoku.
-        If the algorithm cant find any solution, must raise ValueError
+        If the algorithm cant find any solution, must raise ValueError.
+        :param timeout: Maximum number of seconds to solve it
+        :param max_nodes: Maximum number of search nodes expanded (or steps of iterative solvers)
+        If any of the limits is exceeded, SolveTimeout is raised (check limits())
         '''
         raise NotImplementedError()
 
-    def benchmark(self, n=100, *args, **kwargs):
+
+    @contextmanager
+    def limits(self, timeout=None, max_nodes=None):
         '''
-        Run this sudoku solver and evaluate performance and accuracy
+        Context manager used by solve() implementations to set the limits of the sudoku being
+        solved on the budget attribute (the search loops call budget.spend() on each node if its
+        not None). If both limits are None, nothing is done
+        '''
+        if timeout is None and max_nodes is None:
+            yield
+            return
+        budget = self.budget
+        self.budget = SolveBudget(timeout, max_nodes)
+        try:
+            yield
+        finally:
+            self.budget = budget
+
+
+    def enable_stats(self):
+        '''
+        Enables the statistics of this solver. Returns the SolverStats instance where
+        they are accumulated (also available as solver.stats).
+        When enabled, solve_many collects the statistics of each sudoku separately (check
+        collect_stats()) and returns them on the results
+        '''
+        if self.stats is None:
+            self.stats = SolverStats()
+        return self.stats
+
+
+    def disable_stats(self):
+        '''
+        Disables the statistics of this solver
+        '''
+        self.stats = None
+
+
+    @contextmanager
+    def collect_stats(self):
+        '''
+        Context manager which collects the statistics of the sudokus solved while its active
+        (including the queries of the cells, check solvers.stats.instrument) on a new
+        SolverStats instance. When it finishes, they are added to the stats of the solver if
+        enabled. e.g:
+
+        with solver.collect_stats() as stats:
+            solver.solve(sudoku)
+        print(stats.nodes, stats.backtracks)
+        '''
+        total = self.stats
+        stats = self.stats = SolverStats()
+        try:
+            with instrument(stats):
+                yield stats
+        finally:
+            self.stats = total
+            if total is not None:
+                total += stats
+
+
+    def solve_many(self, sudokus, workers=1, ordered=True, chunksize=None, timeout=None, max_nodes=None):
+        '''
+        Solves a stream of sudokus. It returns an iterator of SolveResult instances (one for each
+        sudoku). The input is consumed lazily and at most 2 * workers chunks of sudokus are being
+        solved at the same time, so it can be used with very large (or infinite) streams.
+        The given sudokus are not modified.
+
+        :param sudokus: An iterable of Sudoku instances or array-like objects with 81 numbers
+        :param workers: Number of processes used to solve the sudokus. If its 1, they are solved
+        in the current process
+        :param ordered: If True, results are returned in the same order as the sudokus. Otherwise
+        they are returned as soon as they are available
+        :param chunksize: Number of sudokus sent to a worker at once (by default 1 if workers is 1
+        and 16 otherwise)
+        :param timeout, max_nodes: Limits to solve each sudoku (check solve())
+        '''
+        assert workers > 0
+        # Invalid limits are rejected now (not reported as errors of each sudoku)
+        SolveBudget(timeout, max_nodes)
+        limits = {name: value for name, value in (('timeout', timeout), ('max_nodes', max_nodes)) if value is not None}
+
+        if chunksize is None:
+            chunksize = 1 if workers == 1 else 16
+        chunks = _chunks(sudokus, chunksize)
+
+        if workers == 1:
+            for start, chunk in chunks:
+                yield from _solve_results(start, chunk, _solve_chunk(self, chunk, limits))
+            return
+
+        executor = ProcessPoolExecutor(workers)
+        pending = deque()
+        try:
+            for start, chunk in chain(chunks, [(None, None)]):
+                if chunk is not None:
+                    pending.append((start, chunk, executor.submit(_solve_chunk, self, chunk, limits)))
+                    if len(pending) < 2 * workers:
+                        continue
+
+                # Return the results of the next chunk completed (or the oldest one if ordered
+                # is True) until there is room for a new chunk
+                while pending and (chunk is None or len(pending) >= 2 * workers):
+                    if not ordered:
+                        wait([future for start, chunk, future in pending], return_when=FIRST_COMPLETED)
+                        item = next(item for item in pending if item[2].done())
+                        pending.remove(item)
+                    else:
+                        item = pending.popleft()
+                    start, values, future = item
+                    yield from _solve_results(start, values, future.result())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def benchmark(self, n=100, *args, workers=1, chunksize=None, warmup=0, timeout=None, max_nodes=None, **kwargs):
+        '''
+        Run this sudoku solver and evaluate performance and accuracy (check benchmark.run_benchmark)
         :param n: Number of sudokus to be used to evaluate this algorithm (they will be
         fetched from sudoku dataset)
+        :param workers: Number of processes used to solve the sudokus. If its greater than 1,
+        the samples are sent in chunks to a pool of processes. Solve times are measured inside
+        the workers, so the communication overhead is not counted
+        :param chunksize: Number of samples sent to a worker at once (by default its chosen
+        depending on n and the number of workers)
+        :param warmup: Number of samples solved before the measurements
+        :param timeout, max_nodes: Limits to solve each sample (check solve()). Samples which
+        exceed them are reported as timeouts
+        :return Returns a dictionary with the fields of benchmark.BenchmarkResult. solve_time (the
+        mean solve time) and failures (number of invalid samples) are also included
         '''
-        assert n > 0
+        assert n > 0 and workers > 0
 
         from dataset import SudokuDataset
-        samples = SudokuDataset().get_samples(return_solutions=True, shuffle=True, *args, **kwargs)
+        from benchmark import run_benchmark
+        samples = list(islice(SudokuDataset().get_samples(return_solutions=True, shuffle=True, *args, **kwargs), n))
 
+        result = run_benchmark(
+            self, [sample for sample, solution in samples], [solution for sample, solution in samples],
+            warmup=warmup, workers=workers, chunksize=chunksize, timeout=timeout, max_nodes=max_nodes, verbose=True)
+        print(result)
 
-        solved_count, count = 0, 0
-        elapsed_time = 0.0
-        failures_count = 0
+        # Return dict with metrics
+        return dict(result.to_dict(), solve_time=result.mean, failures=result.invalid)
 
-        accuracy = 0.0
-        solve_time = 0.0
 
 
-        for sample, solution in islice(samples, n):
-            count += 1
-            try:
-                result = sample.copy()
-                t0 = time()
-                self.solve(result)
-                t1 = time()
 
-                if result != solution:
-                    raise ValueError()
+### Helper functions used by SudokuSolver.solve_many
 
-                # Solved sudoku succesfully
-                elapsed_time += t1 - t0
-                solved_count += 1
+def _chunks(sudokus, chunksize):
+    # Groups the sudokus in uint8 arrays of shape (chunksize, 81). Returns an iterator of
+    # tuples (index of the first sudoku of the chunk, chunk)
+    sudokus = iter(sudokus)
+    start = 0
+    while True:
+        chunk = [np.asarray(sudoku, dtype=np.uint8).reshape([81]) for sudoku in islice(sudokus, chunksize)]
+        if not chunk:
+            break
+        yield start, np.stack(chunk)
+        start += len(chunk)
 
-            except ValueError:
-                pass
 
-            except AssertionError:
-                failures_count += 1
+def _solve_chunk(solver, chunk, limits):
+    # Solves a chunk of sudokus (this is executed on the workers). limits are the keyword arguments
+    # timeout and max_nodes (if given). Returns a list of tuples (solution numbers or None, error,
+    # elapsed time, statistics or None)
+    results = []
+    for values in chunk:
+        sudoku = Sudoku(values.reshape([9, 9]))
+        with solver.collect_stats() if solver.stats is not None else nullcontext() as stats:
+            t0 = perf_counter_ns()
+            try:
+                solver.solve(sudoku, **limits)
+                solution, error = sudoku.values, None
 
-            accuracy = solved_count / count
-            if solved_count > 0:
-                solve_time = elapsed_time / solved_count
+            except SolveTimeout:
+                solution, error = None, 'timeout'
 
-            # Print metrics
-            info = []
-            info.append("{:2.2f}% accuracy".format(100 * accuracy))
-            if solved_count > 0:
-                info.append("{:.3f} secs/sample".format(solve_time))
+            except ValueError:
+                solution, error = None, 'unsolved'
 
-            if failures_count > 0:
-                info.append("{} failures".format(failures_count))
+            except AssertionError:
+                solution, error = None, 'invalid'
+            elapsed = (perf_counter_ns() - t0) / 1e9
+        results.append((solution, error, elapsed, stats.to_dict() if stats is not None else None))
+    return results
 
-            info.append("{} / {}".format(count, n))
 
-            print('    '.join([stat.ljust(20) for stat in info]), end='\r')
-        print()
+def _solve_results(start, chunk, results):
+    # Converts the results of _solve_chunk to SolveResult instances
+    for k, (values, (solution, error, elapsed, stats)) in enumerate(zip(chunk, results)):
+        yield SolveResult(
+            start + k, Sudoku(values.reshape([9, 9])),
+            Sudoku(solution) if solution is not None else None,
+            error, elapsed, stats)
 
-        # Return dict with metrics
-        return dict(accuracy=accuracy, solve_time=solve_time, failures=failures_count)
 
 
 
@@ -94,14 +319,18 @@ class SudokuIterativeSolver(SudokuSolver):
         raise NotImplementedError()
 
 
-    def solve(self, sudoku: Sudoku):
+    def solve(self, sudoku: Sudoku, timeout=None, max_nodes=None):
         assert sudoku.valid
 
-        while not sudoku.full:
-            prev = sudoku.copy() if __debug__ else sudoku
-            self.step(sudoku)
-            assert sudoku.valid and prev < sudoku and\
-                sudoku.empty_cells_count == (prev.empty_cells_count-1)
+        with self.limits(timeout, max_nodes):
+            budget = self.budget
+            while not sudoku.full:
+                if budget is not None:
+                    budget.spend()
+                prev = sudoku.copy() if __debug__ else sudoku
+                self.step(sudoku)
+                assert sudoku.valid and prev < sudoku and\
+                    sudoku.empty_cells_count == (prev.empty_cells_count-1)
 
 
 
@@ -0,0 +1,148 @@
+'''
+This module defines the counters collected by the solvers while solving sudokus (number of
+search nodes, backtracks, queries of the remaining numbers of the cells and validity checks).
+
+Solvers count their nodes and backtracks only if their stats attribute is not None (check
+SudokuSolver.enable_stats). The queries of the cells are counted by replacing the properties of
+SudokuCell and Sudoku with instrumented versions while instrument() is active, so they have no
+overhead at all when statistics are disabled.
+'''
+
+import threading
+from contextlib import contextmanager
+from time import perf_counter_ns
+from sudoku import Sudoku, SudokuCell
+
+
+
+class SolverStats:
+    '''
+    Counters collected while solving sudokus:
+    nodes is the number of search decisions made (numbers tried on a cell during the search),
+    backtracks the number of decisions undone, remaining_numbers_calls the number of times the
+    remaining numbers of a cell were queried (remaining_numbers or remaining_numbers_mask, the
+    queries made by the validity checks are not included), valid_calls the number of validity
+    checks (SudokuCell.valid and Sudoku.valid) and valid_time the time spent on them (in nanoseconds)
+    '''
+    FIELDS = ('nodes', 'backtracks', 'remaining_numbers_calls', 'valid_calls', 'valid_time')
+    __slots__ = FIELDS
+
+    def __init__(self, **counters):
+        for field in self.FIELDS:
+            setattr(self, field, counters.pop(field, 0))
+        if counters:
+            raise TypeError('Unknown counters: {}'.format(', '.join(counters)))
+
+
+    def reset(self):
+        '''
+        Sets all the counters to zero
+        '''
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+    def __iadd__(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+    def __add__(self, other):
+        result = SolverStats(**self.to_dict())
+        result += other
+        return result
+
+    def __eq__(self, other):
+        return isinstance(other, SolverStats) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return 'SolverStats({})'.format(', '.join('{}={}'.format(field, getattr(self, field)) for field in self.FIELDS))
+
+
+
+### Instrumentation of the sudoku cells
+
+# Each thread keeps the stats being collected (active, the last one receives the counts) and the
+# number of validity checks running (nested, the queries made inside them are not counted)
+_local = threading.local()
+
+# Number of instrument() contexts active on all the threads and the original properties of the
+# classes instrumented (protected by _lock)
+_lock = threading.Lock()
+_users, _originals = 0, []
+
+
+def _counted(prop):
+    # Returns a property which counts the calls to the given one
+    getter = prop.fget
+    def wrapper(self):
+        active = getattr(_local, 'active', None)
+        if active and not _local.nested:
+            active[-1].remaining_numbers_calls += 1
+        return getter(self)
+    return property(wrapper, doc=prop.__doc__)
+
+
+def _timed(prop):
+    # Returns a property which counts the calls to the given one and measures its time
+    getter = prop.fget
+    def wrapper(self):
+        active = getattr(_local, 'active', None)
+        if not active:
+            # Called from a thread which is not collecting stats
+            return getter(self)
+        stats = active[-1]
+        _local.nested += 1
+        t0 = perf_counter_ns()
+        try:
+            return getter(self)
+        finally:
+            _local.nested -= 1
+            stats.valid_calls += 1
+            stats.valid_time += perf_counter_ns() - t0
+    return property(wrapper, doc=prop.__doc__)
+
+
+# Properties replaced while instrumenting: (class, name, wrapper)
+_HOOKS = (
+    (SudokuCell, 'remaining_numbers_mask', _counted),
+    (SudokuCell, 'valid', _timed),
+    (Sudoku, 'valid', _timed)
+)
+
+
+@contextmanager
+def instrument(stats):
+    '''
+    Context manager which counts the queries of the remaining numbers and the validity checks
+    of all the sudokus on the given SolverStats instance while its active. It can be nested (only
+    the innermost stats are updated) and used by several threads at the same time (only the
+    queries made by the current thread are counted)
+    '''
+    global _users
+    active = getattr(_local, 'active', None)
+    if active is None:
+        active = _local.active = []
+        _local.nested = 0
+
+    with _lock:
+        if _users == 0:
+            for cls, name, hook in _HOOKS:
+                _originals.append((cls, name, cls.__dict__[name]))
+                setattr(cls, name, hook(cls.__dict__[name]))
+        _users += 1
+    active.append(stats)
+    try:
+        yield stats
+    finally:
+        active.pop()
+        with _lock:
+            _users -= 1
+            if _users == 0:
+                while _originals:
+                    cls, name, prop = _originals.pop()
+                    setattr(cls, name, prop)
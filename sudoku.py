@@ -11,9 +11,8 @@ from numpy import ndarray
 import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
 from itertools import product
-from functools import partial, reduce, lru_cache
+from functools import partial, reduce, lru_cache, cached_property
 import collections.abc
-import re
 import operator
 from visualization import SudokuPlot
 
@@ -72,23 +71,122 @@ class SudokuSquareIndexParser(ListIndexParser):
 
 
 
+### Lookup tables
+
+# Units (rows, columns and squares) are identified by a single index: rows are numbered
+# from 0 to 8, columns from 9 to 17 and squares from 18 to 26.
+# CELL_UNITS[k] are the indices of the row, column and square that contains the kth cell
+CELL_UNITS = tuple((k // 9, 9 + k % 9, 18 + (k // 27) * 3 + (k % 9) // 3) for k in range(0, 81))
+
+# Numbers are encoded in bitmasks as 1 << num (bit 0 is never used)
+ALL_NUMBERS_MASK = 0b1111111110
+
+# MASK_NUMBERS[mask] is the set of numbers encoded in the given bitmask
+MASK_NUMBERS = tuple(frozenset(num for num in range(1, 10) if mask & (1 << num)) for mask in range(0, 1 << 10))
+
+# UNITS[unit] are the indices of the 9 cells inside the given unit
+UNITS = np.array([[k for k in range(0, 81) if unit in CELL_UNITS[k]] for unit in range(0, 27)])
+
+# PEERS[k] are the indices of the cells which share a row, column or square with the kth cell
+PEERS = tuple(tuple(sorted(set(UNITS[list(CELL_UNITS[k])].flatten().tolist()) - {k})) for k in range(0, 81))
+
+# Same as CELL_UNITS but as three arrays (indices of the row, column and square units of each cell)
+CELL_ROWS, CELL_COLUMNS, CELL_SQUARES = np.array(CELL_UNITS).T
+
+# POPCOUNT[mask] is the number of bits set on the given bitmask
+POPCOUNT = np.array([bin(mask).count('1') for mask in range(0, 1 << 10)], dtype=np.uint8)
+
+# CELL_COUNTERS[k] are the positions of the counters of number 0 on the row, column and square
+# of the kth cell (the counter of the number n is at CELL_COUNTERS[k] + n)
+CELL_COUNTERS = np.array(CELL_UNITS) * 10
+
+# Bitmasks of the numbers 0 to 9
+NUMBER_BITS = 1 << np.arange(0, 10)
+
+
+
+### Helper functions
+def _units_masks(cells):
+    '''
+    Returns the bitmasks with the numbers present in each row, column and square of the given
+    sudoku configurations.
+    :param cells: Must be an array of shape (..., 81)
+    :return An uint16 array of shape (..., 27)
+    '''
+    return np.bitwise_or.reduce(np.left_shift(np.uint16(1), cells[..., UNITS]), axis=-1) & ALL_NUMBERS_MASK
+
+
+def _remaining_numbers_masks(cells, masks):
+    '''
+    Returns the bitmasks with the remaining numbers of every cell (zero for filled cells)
+    :param cells: Must be an array of shape (..., 81)
+    :param masks: The units bitmasks of the configurations (as returned by _units_masks)
+    :return An uint16 array of shape (..., 81)
+    '''
+    cells_masks = masks[..., CELL_ROWS] | masks[..., CELL_COLUMNS] | masks[..., CELL_SQUARES]
+    return np.where(cells == 0, ~cells_masks & ALL_NUMBERS_MASK, 0).astype(np.uint16)
+
+
+def _valid_configurations(values):
+    '''
+    Checks if the given sudoku configurations are valid using numpy reductions only.
+    :param values: Must be an array of shape (..., 9, 9)
+    :return Returns a boolean array of shape (...). Its the same as calling Sudoku.valid on
+    each configuration: no number is repeated within any row, column or square and every
+    empty cell has at least one remaining number
+    '''
+    cells = values.reshape(values.shape[:-2] + (81,))
+    masks = _units_masks(cells)
+
+    # A number is repeated in a unit if it has more filled cells than different numbers
+    no_repetitions = np.all(POPCOUNT[masks] == np.count_nonzero(cells[..., UNITS], axis=-1), axis=-1)
+
+    # Empty cells where no number can be placed
+    cells_masks = masks[..., CELL_ROWS] | masks[..., CELL_COLUMNS] | masks[..., CELL_SQUARES]
+    no_dead_cells = ~np.any((cells == 0) & (cells_masks == ALL_NUMBERS_MASK), axis=-1)
+
+    return no_repetitions & no_dead_cells
+
+
+def _pack_cells(cells):
+    '''
+    Packs the values of the 81 cells (uint8 array) in 41 bytes: two cells per byte, the first
+    one on the high nibble (the low nibble of the last byte is always zero)
+    '''
+    cells = np.append(cells, np.uint8(0))
+    return ((cells[0::2] << 4) | cells[1::2]).tobytes()
+
+
+def _unpack_cells(data):
+    '''
+    Reverses _pack_cells: returns an uint8 array with the values of the 81 cells
+    '''
+    packed = np.frombuffer(data, dtype=np.uint8)
+    cells = np.empty(82, dtype=np.uint8)
+    cells[0::2], cells[1::2] = packed >> 4, packed & 0x0F
+    return cells[:81]
+
+
 
 
 class SudokuCell:
     '''
     Instances of this class represents a single cell of an arbitrary sudoku configuration.
+    Each sudoku keeps a table with its 81 cells which is reused (see Sudoku.cell())
     '''
+    __slots__ = ('_sudoku', '_index')
+
     def __init__(self, sudoku, index):
         self._sudoku, self._index = sudoku, index
 
     @property
     def value(self):
-        return int(self._sudoku.values.flatten().__getitem__(self._index))
+        return self._sudoku._cells.item(self._index)
 
     @value.setter
     def value(self, num):
         assert num in range(0, 10)
-        self._sudoku.values.put(self._index, num)
+        self._sudoku._put(self._index, num)
 
     @value.deleter
     def value(self):
@@ -190,9 +288,28 @@ class SudokuCell:
         Otherwise, its valid only if the number written on this cell is not repeated in its row,
         column or square
         '''
-        if self == 0:
-            return len(self.remaining_numbers) > 0
-        return all(map(lambda unit: unit.count(self) == 1, [self.row, self.column, self.square]))
+        num = self.value
+        if num == 0:
+            return self.remaining_numbers_mask != 0
+        counts = self._sudoku._units_counts
+        if counts is None:
+            counts = self._sudoku._update_units()[0]
+        return all(counts[unit * 10 + num] == 1 for unit in CELL_UNITS[self._index])
+
+
+    @property
+    def remaining_numbers_mask(self):
+        '''
+        Same as remaining_numbers but the numbers are returned as a bitmask (bit i is set
+        if the number i can be assigned to this cell)
+        '''
+        if self.value != 0:
+            return 0
+        masks = self._sudoku._units_masks
+        if masks is None:
+            masks = self._sudoku._update_units()[1]
+        row, col, square = CELL_UNITS[self._index]
+        return ~(masks[row] | masks[col] | masks[square]) & ALL_NUMBERS_MASK
 
 
     @property
@@ -201,9 +318,7 @@ class SudokuCell:
         If this cell is not empty, returns an empty frozenset. Otherwise, it returns all the numbers not
         present in the row, column or square containing this cell as a frozenset instance
         '''
-        if self != 0:
-            return frozenset()
-        return reduce(operator.__and__, map(lambda unit: unit.remaining_numbers, [self.row, self.column, self.square]))
+        return MASK_NUMBERS[self.remaining_numbers_mask]
 
 
     def __str__(self):
@@ -228,11 +343,11 @@ class SudokuSection(np.ndarray):
 
 
     def __getitem__(self, item):
-        values = self.values.__getitem__(item)
+        values = self._array.__getitem__(item)
         indices = self._indices.__getitem__(item)
         if isinstance(indices, np.ndarray):
             return SudokuSection(self._sudoku, indices, values)
-        return SudokuCell(self._sudoku, indices)
+        return self._sudoku.cell(indices)
 
 
     def __setitem__(self, item, value):
@@ -243,29 +358,53 @@ class SudokuSection(np.ndarray):
                 value = np.array(value, dtype=np.uint8)
                 assert np.all(np.isin(value.flatten(), range(0, 10)))
 
+        sudoku = getattr(self, '_sudoku', None)
+        if sudoku is None:
+            # Not a view of a sudoku (e.g. the result of a comparison)
+            super().__setitem__(item, value)
+            return
+
+        # Keep the units bitmasks of the sudoku up to date
+        indices = self._indices.__getitem__(item)
+        prev = sudoku._cells[indices]
         super().__setitem__(item, value)
+        sudoku._cells_changed(indices, prev)
 
 
     def __delitem__(self, item):
-        super().__setitem__(item, 0)
+        self.__setitem__(item, 0)
 
     def __iter__(self):
-        return map(partial(SudokuCell, self._sudoku), self._indices.flatten())
+        return map(self._sudoku.cell, self._indices.flatten().tolist())
 
 
     @property
     def values(self):
         '''
-        Returns a regular numpy ndarray view to this instance
+        Returns a regular numpy ndarray view to this instance. The cells can be modified through
+        it (the units counters of the sudoku are recomputed the next time they are needed, so the
+        array must not be kept to modify the sudoku later)
         '''
+        sudoku = getattr(self, '_sudoku', None)
+        if sudoku is not None:
+            sudoku._reset_units()
         return self.view(type=np.ndarray)
 
+    @property
+    def _array(self):
+        # Same as values but only for reading (the units counters are kept)
+        return self.view(type=np.ndarray)
+
+
+    def fill(self, value):
+        self.__setitem__(Ellipsis, value)
+
 
     def clear(self):
         '''
         Clear all the sudoku cells inside this section (set their values to 0)
         '''
-        self.fill(0)
+        self.__setitem__(Ellipsis, 0)
 
 
     def flatten(self):
@@ -274,7 +413,7 @@ class SudokuSection(np.ndarray):
         '''
         if self.ndim == 1:
             return self
-        return SudokuSection(self._sudoku, self._indices.flatten(), self.values.flatten())
+        return SudokuSection(self._sudoku, self._indices.flatten(), self._array.flatten())
 
 
     @property
@@ -337,7 +476,7 @@ class SudokuSection(np.ndarray):
         '''
         Returns all the numbers in this sudoku section
         '''
-        cells = self.values.flatten()
+        cells = self._array.flatten()
         return cells[cells > 0]
 
 
@@ -346,7 +485,7 @@ class SudokuSection(np.ndarray):
         '''
         Returns all the numbers (removing repetitions) in this sudoku section
         '''
-        return frozenset(self.values.flatten()) - {0}
+        return frozenset(self._array.flatten()) - {0}
 
 
     @property
@@ -360,6 +499,26 @@ class SudokuSection(np.ndarray):
 
 
 
+def _inplace_operator(name):
+    # Wraps an in-place operator of ndarray (it writes the cells directly, so the units counters of
+    # the sudoku are discarded)
+    operator = getattr(np.ndarray, name)
+    def wrapper(self, other):
+        sudoku = getattr(self, '_sudoku', None)
+        if sudoku is not None:
+            sudoku._reset_units()
+        return operator(self, other)
+    wrapper.__name__ = name
+    return wrapper
+
+for name in ('__iadd__', '__isub__', '__imul__', '__itruediv__', '__ifloordiv__', '__imod__', '__ipow__',
+             '__ilshift__', '__irshift__', '__iand__', '__ior__', '__ixor__'):
+    setattr(SudokuSection, name, _inplace_operator(name))
+
+
+
+
+
 class Sudoku(SudokuSection):
     '''
     Objects of this class represents a specific configuration for a sudoku grid.
@@ -369,6 +528,13 @@ class Sudoku(SudokuSection):
     The first dimension of the array are for rows. The second dimension stands for
     columns
     sudoku[i, j] will be the cell at the ith row and jth column
+
+    Each sudoku also keeps, for every row, column and square, how many times each number
+    appears on it (and a bitmask with the numbers present). They are updated incrementally
+    whenever a cell is written via SudokuCell, SudokuSection or the rows, columns and squares
+    views, so that remaining_numbers and valid queries on cells dont need to scan the grid.
+    Accessing values, fill() and in-place operators (e.g. sudoku += 1) discard them, so they are
+    computed again from the cells when needed
     '''
 
     class UnitsView:
@@ -380,7 +546,7 @@ class Sudoku(SudokuSection):
             return SudokuSection(
                 self.sudoku,
                 self.sudoku._indices.__getitem__(index),
-                self.sudoku.values.__getitem__(index)
+                self.sudoku._array.__getitem__(index)
             )
 
         def __setitem__(self, index, value):
@@ -404,41 +570,161 @@ class Sudoku(SudokuSection):
 
 
     def __new__(cls, values=None):
-        if values is None or not isinstance(values, Sudoku):
-            sudoku = np.zeros(shape=(9, 9), dtype=np.uint8).view(type=Sudoku)
-            if values is not None:
-                np.put(sudoku, np.arange(0, 81), values)
-            return sudoku
-        return np.array(values, copy=True, subok=True)
+        if values is None:
+            return np.zeros(shape=(9, 9), dtype=np.uint8).view(type=cls)
+        values = np.array(values, dtype=np.uint8)
+        if values.size != 81:
+            # Fill the 81 cells repeating the given values
+            values = np.resize(values, 81)
+        return values.reshape([9, 9]).view(type=cls)
 
 
     indices = np.arange(0, 81).reshape([9, 9])
     def __init__(self, values=None):
         super().__init__(self, indices=self.indices)
-        self.squares = self.SquaresView(self)
-        self.rows = self.RowsView(self)
-        self.columns = self.cols = self.ColumnsView(self)
+        self._cells = self.view(type=np.ndarray).reshape(81)
+        self._cells_table = None
+        # The units counters are computed on demand (check _update_units)
+        self._units_counts = self._units_masks = None
+
 
+    @cached_property
+    def squares(self):
+        return self.SquaresView(self)
+
+    @cached_property
+    def rows(self):
+        return self.RowsView(self)
+
+    @cached_property
+    def columns(self):
+        return self.ColumnsView(self)
+
+    @property
+    def cols(self):
+        return self.columns
+
+
+    def cell(self, index):
+        '''
+        Returns the cell with the given index (0 to 80 in row-major order). Cells are created only
+        once per sudoku (the same SudokuCell instance is returned on each call)
+        '''
+        table = self._cells_table
+        if table is None:
+            table = self._cells_table = tuple(SudokuCell(self, k) for k in range(0, 81))
+        return table[index]
+
+
+    def __iter__(self):
+        table = self._cells_table
+        if table is None:
+            self.cell(0)
+            table = self._cells_table
+        return iter(table)
+
+
+    def _update_units(self):
+        '''
+        Recomputes the number of occurrences of each number on every row, column and
+        square (and their bitmasks) from scratch.
+        :return Returns the counters and the bitmasks of the units
+        '''
+        cells = self._cells
+        filled = cells != 0
+        counts = np.bincount((CELL_COUNTERS[filled] + cells[filled, None]).flatten(), minlength=270)
+        masks = (counts.reshape([27, 10]) > 0) @ NUMBER_BITS
+
+        self._units_counts, self._units_masks = counts.tolist(), masks.tolist()
+        return self._units_counts, self._units_masks
+
+
+    def _reset_units(self):
+        # Discards the units counters (they are computed again when needed)
+        self._units_counts = self._units_masks = None
+
+
+    def _update_cell(self, index, prev, num):
+        # Update the units counters after replacing the number prev with num in the given cell
+        counts, masks = self._units_counts, self._units_masks
+        if counts is None:
+            # Not computed yet
+            return
+        for unit in CELL_UNITS[index]:
+            if prev != 0:
+                counts[unit * 10 + prev] -= 1
+                if counts[unit * 10 + prev] == 0:
+                    masks[unit] &= ~(1 << prev)
+            if num != 0:
+                counts[unit * 10 + num] += 1
+                masks[unit] |= 1 << num
+
+
+    def _put(self, index, num):
+        # Write a number on the cell with the given index
+        num = int(num)
+        prev = int(self._cells[index])
+        if prev != num:
+            self._cells[index] = num
+            self._update_cell(index, prev, num)
+
+
+    def _cells_changed(self, indices, prev):
+        # Must be called after writing the cells with the given indices (prev are their
+        # previous values)
+        if np.ndim(indices) == 0:
+            self._update_cell(int(indices), int(prev), int(self._cells[indices]))
+            return
+
+        visited = set()
+        for index, a, b in zip(np.ravel(indices).tolist(), np.ravel(prev).tolist(), np.ravel(self._cells[indices]).tolist()):
+            if a != b and index not in visited:
+                visited.add(index)
+                self._update_cell(index, a, b)
+
+
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0):
+        '''
+        Creates a sudoku which shares its memory with the given buffer (any object that supports
+        the buffer protocol like bytearray, memoryview, mmap or a contiguous numpy array of uint8).
+        The values are not copied: changes on the sudoku are written to the buffer.
+        Read-only buffers (e.g. bytes) give read-only sudokus
+
+        :param buffer: The buffer with the 81 values of the cells in row-major order
+        :param offset: Position of the first value inside the buffer (in bytes)
+        '''
+        sudoku = np.frombuffer(buffer, dtype=np.uint8, count=81, offset=offset).reshape([9, 9]).view(type=cls)
+        sudoku.__init__()
+        return sudoku
 
 
     @classmethod
-    def random(cls):
+    def random(cls, clues=None, difficulty=None, seed=None):
         '''
-        This method returns a sudoku with some of its cells filled randomly with
-        numbers and the rest are left empty (this is used for testing purposes)
+        This method returns a random valid sudoku puzzle with a unique solution
+        (check generator.SudokuGenerator)
+        :param clues: Number of clues of the puzzle. By default, a minimal puzzle is returned
+        :param difficulty: One of 'easy', 'medium', 'hard' or None
+        :param seed: An integer to get always the same puzzle
         '''
-        nums = ((np.random.randint(9, size=81) + 1) * (np.random.random(81) >= 0.4)).reshape([9, 9])
-        return Sudoku(nums)
+        from generator import SudokuGenerator
+        return SudokuGenerator(clues, difficulty, seed).generate()[0]
 
 
     @classmethod
     def fromstring(cls, s):
         '''
         Creates a sudoku configuration from a string. The string must be a sequence of 81
-        integer values separated by spaces, carriage returns tabs or commas.
-
+        numbers (0 or '.' for empty cells) optionally separated by spaces, carriage returns tabs or commas.
+        To read many sudokus at once, use sudokuio.SudokuReader
         '''
-        return Sudoku(np.fromstring(re.sub('[\n\t, ]+', '-', s), sep='-', dtype=np.uint8).reshape([9, 9]))
+        from sudokuio import _decode_grid
+        cells, positions = _decode_grid(s.encode('ascii'))
+        if cells.size != 81:
+            raise ValueError('Sudoku configurations must have 81 numbers')
+        return cls.from_buffer(cells)
 
 
     @classmethod
@@ -456,7 +742,85 @@ class Sudoku(SudokuSection):
         '''
         Make a copy of this sudoku; return another sudoku instance with the same values
         '''
-        return Sudoku(self)
+        return self.copy_into(Sudoku.from_buffer(bytearray(81)))
+
+
+    def copy_into(self, other):
+        '''
+        Copies the values of this sudoku to another sudoku instance (no objects are created, so
+        its cheaper than copy() when restoring a saved state many times during a search).
+        Returns the other sudoku
+        '''
+        other._cells[:] = self._cells
+        counts, masks = self._units_counts, self._units_masks
+        if counts is None:
+            other._units_counts = other._units_masks = None
+        elif other._units_counts is None:
+            other._units_counts, other._units_masks = list(counts), list(masks)
+        else:
+            other._units_counts[:], other._units_masks[:] = counts, masks
+        return other
+
+
+    def to_bytes(self, packed=False):
+        '''
+        Serializes this sudoku as 81 bytes (one per cell in row-major order) or, if packed is
+        True, as 41 bytes (two cells per byte)
+        '''
+        if packed:
+            return _pack_cells(self._cells)
+        return self._cells.tobytes()
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''
+        Creates a sudoku from the bytes returned by to_bytes() (the format is deduced from
+        their length). Raises ValueError if the data is not a valid serialized sudoku
+        '''
+        if len(data) == 41:
+            cells = _unpack_cells(data)
+        elif len(data) == 81:
+            cells = np.frombuffer(data, dtype=np.uint8)
+        else:
+            raise ValueError('Serialized sudokus must have 81 or 41 bytes')
+        if cells.max() > 9:
+            raise ValueError('Serialized sudokus can only contain numbers between 0 and 9')
+        return cls.from_buffer(bytearray(cells.tobytes()))
+
+
+    def __reduce__(self):
+        # Sudokus are pickled as their 81 bytes (no ndarray state or cached views)
+        return type(self).from_bytes, (self.to_bytes(),)
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+
+    def canonical(self):
+        '''
+        Returns the canonical form of this sudoku: the lexicographically minimal configuration
+        among all the sudokus equivalent to it under the symmetries of the sudoku (check
+        symmetry.minlex_canonical_forms). Equivalent sudokus have the same canonical form.
+        :return Returns a tuple with the canonical form (a new Sudoku instance) and the
+        transformation which maps it back to this sudoku (a SudokuTransform instance)
+        '''
+        from symmetry import minlex_canonical_form
+        canonical, transform = minlex_canonical_form(self._array)
+        return Sudoku.from_buffer(canonical), transform.inverse()
+
+
+    def freeze(self):
+        '''
+        Returns an immutable and hashable snapshot of this sudoku (a FrozenSudoku instance)
+        '''
+        return FrozenSudoku(self.to_bytes())
 
 
     @property
@@ -465,7 +829,7 @@ class Sudoku(SudokuSection):
         Returns True if this instance is a valid sudoku configuration. It is valid if
         all its cells are valid (check SudokuCell.valid docs)
         '''
-        return all([cell.valid for cell in self])
+        return bool(_valid_configurations(self._array))
 
 
     @property
@@ -474,7 +838,7 @@ class Sudoku(SudokuSection):
         Returns True if the sudoku is solved. It is considered solved if its a valid
         configuration (valid is True) and all its cells are filled
         '''
-        return self.full and self.valid
+        return bool(np.all(self._cells != 0)) and self.valid
 
 
     def __lt__(self, other):
@@ -482,7 +846,7 @@ class Sudoku(SudokuSection):
             raise ValueError()
 
         return self.empty_cells_count > other.empty_cells_count and\
-            np.all(np.logical_or(self.values == 0, self.values == other.values))
+            np.all(np.logical_or(self._array == 0, self._array == other._array))
 
     def __gt__(self, other):
         if not isinstance(other, Sudoku):
@@ -490,10 +854,10 @@ class Sudoku(SudokuSection):
         return other < self
 
     def __eq__(self, other):
-        return np.all(self.values == other.values)
+        return np.all(self._array == (other._array if isinstance(other, SudokuSection) else other.values))
 
     def __ne__(self, other):
-        return np.any(self.values != other.values)
+        return np.any(self._array != (other._array if isinstance(other, SudokuSection) else other.values))
 
 
     @property
@@ -543,3 +907,208 @@ class Sudoku(SudokuSection):
         Same as str
         '''
         return self.__str__()
+
+
+
+
+class FrozenSudoku:
+    '''
+    Immutable snapshot of a sudoku configuration. Unlike Sudoku instances, it can be used as a
+    dictionary key or inside sets. Two snapshots are equal if all their cells are equal.
+    Hashes are the same across processes (they dont depend on PYTHONHASHSEED)
+    '''
+    __slots__ = ('_data', '_hash')
+
+    def __init__(self, data):
+        '''
+        :param data: The values of the 81 cells as bytes (check Sudoku.to_bytes())
+        '''
+        if len(data) != 81:
+            raise ValueError('Frozen sudokus must be created from 81 bytes')
+        self._data = bytes(data)
+        self._hash = hash(int.from_bytes(self._data, 'big'))
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenSudoku):
+            return NotImplemented
+        return self._hash == other._hash and self._data == other._data
+
+    def __reduce__(self):
+        return FrozenSudoku, (self._data,)
+
+
+    @property
+    def values(self):
+        '''
+        Returns the values of the cells as a read-only uint8 array of size 9x9
+        '''
+        return np.frombuffer(self._data, dtype=np.uint8).reshape([9, 9])
+
+
+    def to_bytes(self, packed=False):
+        '''
+        Same as Sudoku.to_bytes()
+        '''
+        if packed:
+            return _pack_cells(self.values.reshape(81))
+        return self._data
+
+
+    def thaw(self):
+        '''
+        Returns a new (mutable) Sudoku instance with the values of this snapshot
+        '''
+        return Sudoku.from_bytes(self._data)
+
+
+    def __str__(self):
+        return str(self.thaw())
+
+    def __repr__(self):
+        return 'FrozenSudoku({!r})'.format(''.join(map(str, self._data)))
+
+
+
+
+class SudokuBatch:
+    '''
+    Objects of this class represents a batch of N sudoku configurations. They are stored in a single
+    contiguous uint8 array of shape (N, 9, 9) and most of the properties are evaluated for all the
+    configurations at once using numpy vectorized operations.
+
+    batch[k] returns the kth configuration as a Sudoku instance which is a view of the batch
+    (no values are copied). Modifications made via the Sudoku instance will be seen on the batch,
+    but dont modify the batch array directly while holding Sudoku views of it (their remaining
+    numbers counters would be out of date).
+    '''
+    def __init__(self, values):
+        '''
+        Constructor.
+        :param values: An array-like object of shape (N, 9, 9) or (N, 81) with the numbers of
+        the configurations. It will not be copied if its already a C-contiguous uint8 array
+        '''
+        values = np.ascontiguousarray(values, dtype=np.uint8)
+        if values.shape[1:] not in ((81,), (9, 9)):
+            raise ValueError('Sudoku batch values must have shape (N, 9, 9) or (N, 81)')
+        self._values = values.reshape([-1, 9, 9])
+
+
+    @classmethod
+    def empty(cls, n):
+        '''
+        Creates a batch of n sudoku configurations with all their cells empty
+        '''
+        return cls(np.zeros([n, 9, 9], dtype=np.uint8))
+
+
+    @classmethod
+    def from_sudokus(cls, sudokus):
+        '''
+        Creates a new batch from a list of sudoku configurations (values are copied)
+        '''
+        sudokus = [sudoku.values if isinstance(sudoku, SudokuSection) else sudoku for sudoku in sudokus]
+        if len(sudokus) == 0:
+            return cls.empty(0)
+        return cls(np.stack(sudokus).astype(np.uint8, copy=False))
+
+
+    def to_sudokus(self, copy=False):
+        '''
+        Returns a list of Sudoku instances with the configurations of this batch.
+        :param copy: If False (default), the sudokus will be views of this batch. Otherwise they
+        will be independent copies
+        '''
+        if copy:
+            return [Sudoku(values) for values in self._values]
+        return list(self)
+
+
+    def canonical(self):
+        '''
+        Same as Sudoku.canonical() but for all the configurations of the batch at once.
+        Returns a new batch with the canonical forms and a list with the transformations
+        which map them back to the configurations of this batch
+        '''
+        from symmetry import minlex_canonical_forms
+        canonical, transforms = minlex_canonical_forms(self._values)
+        return SudokuBatch(canonical), [transform.inverse() for transform in transforms]
+
+
+    def copy(self):
+        '''
+        Returns an independent copy of this batch
+        '''
+        return SudokuBatch(self._values.copy())
+
+
+    @property
+    def values(self):
+        '''
+        Returns the underlying uint8 array of shape (N, 9, 9)
+        '''
+        return self._values
+
+
+    def __len__(self):
+        return self._values.shape[0]
+
+
+    def __getitem__(self, index):
+        if hasattr(index, '__int__') and np.ndim(index) == 0:
+            return Sudoku.from_buffer(self._values[ListIndexParser(len(self)).parse(index)])
+        return SudokuBatch(self._values[index])
+
+
+    def __iter__(self):
+        for values in self._values:
+            yield Sudoku.from_buffer(values)
+
+
+    @property
+    def empty_cells_count(self):
+        '''
+        Returns an array with the number of empty cells of each configuration
+        '''
+        return 81 - np.count_nonzero(self._values.reshape([-1, 81]), axis=1)
+
+
+    @property
+    def full(self):
+        '''
+        Returns a boolean array indicating which configurations have all their cells filled
+        '''
+        return np.all(self._values.reshape([-1, 81]) != 0, axis=1)
+
+
+    @property
+    def valid(self):
+        '''
+        Returns a boolean array indicating which configurations are valid (check Sudoku.valid docs)
+        '''
+        return _valid_configurations(self._values)
+
+
+    @property
+    def solved(self):
+        '''
+        Returns a boolean array indicating which configurations are solved (check Sudoku.solved docs)
+        '''
+        return self.full & self.valid
+
+
+    @property
+    def remaining_numbers_masks(self):
+        '''
+        Returns an uint16 array of shape (N, 9, 9) with the remaining numbers of every cell encoded
+        as bitmasks (bit i is set if the number i can be placed on the cell). Filled cells have
+        no remaining numbers
+        '''
+        cells = self._values.reshape([-1, 81])
+        return _remaining_numbers_masks(cells, _units_masks(cells)).reshape([-1, 9, 9])
+
+
+    def __repr__(self):
+        return 'SudokuBatch({} configurations)'.format(len(self))
@@ -0,0 +1,381 @@
+'''
+This module provides classes to read and write large files of sudoku configurations. Files are
+processed in big blocks of bytes which are decoded / encoded at once with numpy operations.
+
+The next formats are supported:
+    - 'lines': One sudoku per line as a string of 81 characters (blank cells are '0' or '.')
+    - 'csv': The format of the kaggle dataset. A header line followed by one line per sudoku
+    with 81 digits, a comma and other 81 digits (the sudoku and its solution). The solutions
+    column is optional (lines with just the 81 digits of the sudoku)
+    - 'grid': Sequences of 81 numbers separated by whitespaces or commas, like in notebooks/quizz.txt.
+    Every 81 numbers are a sudoku (rows and blank lines are just cosmetic)
+'''
+
+import numpy as np
+from itertools import chain, zip_longest
+from sudoku import SudokuBatch, SudokuSection, FrozenSudoku
+
+
+# Formats supported
+FORMATS = ('lines', 'csv', 'grid')
+
+# Default number of bytes read at once
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+# Header of the csv files (with and without solutions)
+CSV_HEADER = b'quizzes,solutions\n'
+CSV_QUIZZES_HEADER = b'quizzes\n'
+
+# Characters used on the files
+ZERO, DOT, COMMA, NEWLINE = ord('0'), ord('.'), ord(','), ord('\n')
+
+# CHAR_VALUES[c] is the number encoded by the character c (blanks are 0) or INVALID
+INVALID = 0xFF
+CHAR_VALUES = np.full(256, INVALID, dtype=np.uint8)
+CHAR_VALUES[ZERO:ZERO + 10], CHAR_VALUES[DOT] = np.arange(0, 10), 0
+
+# SEPARATORS[c] is True if c is a character allowed between the numbers on the 'grid' format
+SEPARATORS = np.zeros(256, dtype=np.bool_)
+SEPARATORS[[ord(c) for c in ' \t\r\n\f\v,']] = True
+
+# Position of the 81 cells inside a sudoku written with the 'grid' format and the
+# template of the text (with the cells set to zero)
+GRID_ROW = b'0 0 0   0 0 0   0 0 0\n'
+GRID_TEMPLATE = b'\n'.join([GRID_ROW * 3] * 3) + b'\n'
+GRID_CELLS = np.array([k for k, c in enumerate(GRID_TEMPLATE) if c == ZERO])
+
+
+
+### Helper functions
+
+def _decode(chars):
+    # Converts an uint8 array of characters ('0'-'9' or '.') to the numbers of the cells
+    values = chars - np.uint8(ZERO)
+    values[chars == DOT] = 0
+    if np.any(values > 9):
+        raise ValueError('Invalid sudoku configuration found in file')
+    return values
+
+
+def _decode_lines(data, width):
+    '''
+    Decodes a block of complete lines (empty lines are ignored) of width characters each.
+    :return Returns an uint8 array of shape (n, width) with the characters of the n lines
+    '''
+    lines = data.split()
+    if any(len(line) != width for line in lines):
+        raise ValueError('Invalid sudoku configuration found in file')
+    return np.frombuffer(b''.join(lines), dtype=np.uint8).reshape([-1, width])
+
+
+def _decode_grid(data):
+    '''
+    Extracts the numbers of a block in 'grid' format.
+    :return Returns a tuple with an uint8 array with the numbers of all the cells found (its size
+    might not be a multiple of 81) and the positions of those cells in the block
+    '''
+    chars = np.frombuffer(data, dtype=np.uint8)
+    values = CHAR_VALUES[chars]
+    cells = values != INVALID
+    if not np.all(cells | SEPARATORS[chars]):
+        raise ValueError('Invalid sudoku configuration found in file')
+    return values[cells], np.flatnonzero(cells)
+
+
+def _skip_header(data):
+    # Removes the first line of a block of a csv file if its the header
+    lines = data.lstrip().split(b'\n', 1)
+    if lines[0][:1].isalpha():
+        return lines[1] if len(lines) > 1 else b''
+    return data
+
+
+def _encode(cells, blank):
+    # Converts an uint8 array with the numbers of the cells to characters
+    chars = cells + np.uint8(ZERO)
+    if blank != ZERO:
+        chars[cells == 0] = blank
+    return chars
+
+
+def _cells(sudokus):
+    '''
+    Returns the numbers of the given sudokus as an uint8 array of shape (n, 81). sudokus can be
+    a Sudoku, FrozenSudoku, SudokuBatch instance or an array-like of shape (9, 9), (81,), (n, 9, 9)
+    or (n, 81)
+    '''
+    if isinstance(sudokus, (SudokuBatch, SudokuSection, FrozenSudoku)):
+        sudokus = sudokus.values
+    return np.asarray(sudokus, dtype=np.uint8).reshape([-1, 81])
+
+
+def _blocks(sudokus, block_size=4096):
+    '''
+    Splits the given sudokus in arrays of shape (n, 81) with block_size rows (except the last one).
+    sudokus can be anything accepted by _cells or an iterable of sudokus
+    '''
+    if isinstance(sudokus, (SudokuBatch, SudokuSection, FrozenSudoku, np.ndarray)):
+        cells = _cells(sudokus)
+        for k in range(0, cells.shape[0], block_size):
+            yield cells[k:k + block_size]
+        return
+    block = []
+    for sudoku in sudokus:
+        block.append(_cells(sudoku))
+        if len(block) == block_size:
+            yield np.concatenate(block)
+            block = []
+    if block:
+        yield np.concatenate(block)
+
+
+
+def detect_format(data):
+    '''
+    Guess the format of a file from its first bytes. Returns 'lines', 'csv' or 'grid'
+    '''
+    line = data.lstrip().split(b'\n', 1)[0].strip()
+    if len(line) == 81 and line.replace(b'.', b'0').isdigit():
+        return 'lines'
+    if line[:1].isalpha() or (b',' in line and len(line) == 163):
+        # A header or a sudoku and its solution
+        return 'csv'
+    return 'grid'
+
+
+
+### Reader & writer
+
+class SudokuReader:
+    '''
+    Reads sudoku configurations from a file in any of the formats supported. The file is
+    read in blocks of bytes and all the sudokus in a block are decoded at once.
+
+    Iterating over the reader yields Sudoku instances (views of the batches returned by
+    batches(), so that no values are copied). read() returns all the sudokus in a single batch
+    '''
+    def __init__(self, file, format=None, solutions=False, block_size=DEFAULT_BLOCK_SIZE):
+        '''
+        Constructor.
+        :param file: A path or a file object opened in binary mode
+        :param format: One of 'lines', 'csv' or 'grid'. If not specified, its guessed
+        from the contents of the file
+        :param solutions: Only for the 'csv' format. If True, batches() returns pairs of batches
+        with the sudokus and their solutions
+        :param block_size: Number of bytes read from the file at once
+        '''
+        if format is not None and format not in FORMATS:
+            raise ValueError('Format must be one of {}'.format(', '.join(FORMATS)))
+        if solutions and format not in (None, 'csv'):
+            raise ValueError('Only csv files have solutions')
+        self.file, self.format, self.solutions, self.block_size = file, format, solutions, block_size
+
+
+    def _read_blocks(self):
+        # Returns an iterator over the blocks of bytes of the file
+        if isinstance(self.file, (str, bytes)) or hasattr(self.file, '__fspath__'):
+            with open(self.file, 'rb') as f:
+                yield from iter(lambda: f.read(self.block_size), b'')
+        else:
+            yield from iter(lambda: self.file.read(self.block_size), b'')
+
+
+    def batches(self):
+        '''
+        Returns an iterator of SudokuBatch instances with the sudokus on each block of the file
+        (or pairs of batches with the sudokus and their solutions)
+        '''
+        blocks = self._read_blocks()
+        data = next(blocks, b'')
+        if self.format is None:
+            # The first line must be complete to guess the format
+            while b'\n' not in data.lstrip():
+                block = next(blocks, b'')
+                if not block:
+                    break
+                data += block
+        format = self.format or detect_format(data)
+        if self.solutions and format != 'csv':
+            raise ValueError('Only csv files have solutions')
+
+        rest, header = b'', format == 'csv'
+        for data in chain([data], blocks):
+            data = rest + data
+            if format == 'grid':
+                cells, positions = _decode_grid(data)
+                n = cells.size - cells.size % 81
+                # The cells of an incomplete sudoku are decoded again with the next block
+                rest = data[positions[n]:] if n < cells.size else b''
+                if n > 0:
+                    yield SudokuBatch(cells[:n].reshape([-1, 81]))
+                continue
+
+            # Only complete lines are decoded
+            k = data.rfind(b'\n') + 1
+            data, rest = data[:k], data[k:]
+            if header and data.strip():
+                data, header = _skip_header(data), False
+            yield from self._lines_batches(data, format)
+
+        if rest.strip():
+            if format == 'grid':
+                raise ValueError('Incomplete sudoku configuration found at the end of the file')
+            # Last line (without line break)
+            yield from self._lines_batches(_skip_header(rest) if header else rest, format)
+
+
+    def _lines_batches(self, data, format):
+        # Decodes a block of complete lines
+        if format == 'lines':
+            chars = _decode_lines(data, 81)
+            if chars.shape[0] > 0:
+                yield SudokuBatch(_decode(chars))
+            return
+
+        if len(data.lstrip().split(b'\n', 1)[0].strip()) == 81:
+            # csv file without the solutions column
+            if self.solutions:
+                raise ValueError('The csv file has no solutions')
+            chars = _decode_lines(data, 81)
+            if chars.shape[0] > 0:
+                yield SudokuBatch(_decode(chars))
+            return
+
+        chars = _decode_lines(data, 163)
+        if chars.shape[0] == 0:
+            return
+        if np.any(chars[:, 81] != COMMA):
+            raise ValueError('Invalid sudoku configuration found in file')
+        unsolved = SudokuBatch(_decode(chars[:, :81]))
+        yield (unsolved, SudokuBatch(_decode(chars[:, 82:]))) if self.solutions else unsolved
+
+
+    def __iter__(self):
+        for batch in self.batches():
+            if self.solutions:
+                yield from zip(*batch)
+            else:
+                yield from batch
+
+
+    def read(self):
+        '''
+        Reads all the sudokus in the file. Returns a SudokuBatch instance (or a pair of batches
+        with the sudokus and their solutions)
+        '''
+        def concatenate(batches):
+            if not batches:
+                return SudokuBatch.empty(0)
+            return SudokuBatch(np.concatenate([batch.values for batch in batches]))
+
+        batches = list(self.batches())
+        if self.solutions:
+            return concatenate([unsolved for unsolved, solved in batches]), concatenate([solved for unsolved, solved in batches])
+        return concatenate(batches)
+
+
+
+class SudokuWriter:
+    '''
+    Writes sudoku configurations to a file in any of the formats supported. Sudokus are encoded
+    in blocks (all the sudokus of a block are converted to bytes at once).
+    It can be used as a context manager:
+
+    with SudokuWriter('solutions.csv', format='csv') as writer:
+        writer.write(sudokus, solutions)
+    '''
+    def __init__(self, file, format='lines', blank='0'):
+        '''
+        Constructor.
+        :param file: A path or a file object opened in binary mode
+        :param format: One of 'lines', 'csv' or 'grid'
+        :param blank: Character used for blank cells ('0' or '.'). The csv format always use '0'
+        '''
+        if format not in FORMATS:
+            raise ValueError('Format must be one of {}'.format(', '.join(FORMATS)))
+        if blank not in ('0', '.'):
+            raise ValueError('Blank cells must be written as "0" or "."')
+
+        self.format, self.blank = format, ord(blank) if format != 'csv' else ZERO
+        self._owned = isinstance(file, (str, bytes)) or hasattr(file, '__fspath__')
+        self._file = open(file, 'wb') if self._owned else file
+        # The header of csv files is written with the first sudokus (it depends on whether they
+        # have solutions)
+        self._header, self._solutions = format == 'csv', None
+
+
+    def write(self, sudokus, solutions=None):
+        '''
+        Writes the given sudokus to the file.
+        :param sudokus: A Sudoku or SudokuBatch instance, an array of shape (n, 9, 9) or (n, 81) or
+        an iterable of sudokus
+        :param solutions: The solutions of the sudokus (in the same formats). Only accepted for the
+        'csv' format. csv files are written without the solutions column if they are not given on
+        the first call
+        '''
+        if solutions is not None and self.format != 'csv':
+            raise ValueError('Only csv files have solutions')
+
+        if self._header:
+            self._file.write(CSV_HEADER if solutions is not None else CSV_QUIZZES_HEADER)
+            self._header, self._solutions = False, solutions is not None
+        elif self.format == 'csv' and self._solutions != (solutions is not None):
+            raise ValueError('Either all the sudokus of a csv file have solutions or none of them')
+
+        if solutions is None:
+            for cells in _blocks(sudokus):
+                self._file.write(self._encode(cells))
+        else:
+            for cells, solved in zip_longest(_blocks(sudokus), _blocks(solutions)):
+                if cells is None or solved is None or cells.shape != solved.shape:
+                    raise ValueError('Each sudoku must have exactly one solution')
+                self._file.write(self._encode(cells, solved))
+
+
+    def _encode(self, cells, solved=None):
+        # Converts an array of shape (n, 81) with the numbers of n sudokus to bytes
+        n = cells.shape[0]
+        if self.format == 'grid':
+            chars = np.tile(np.frombuffer(GRID_TEMPLATE + b'\n', dtype=np.uint8), [n, 1])
+            chars[:, GRID_CELLS] = _encode(cells, self.blank)
+        elif solved is None:
+            chars = np.empty([n, 82], dtype=np.uint8)
+            chars[:, :81], chars[:, 81] = _encode(cells, self.blank), NEWLINE
+        else:
+            chars = np.empty([n, 164], dtype=np.uint8)
+            chars[:, :81], chars[:, 81] = _encode(cells, self.blank), COMMA
+            chars[:, 82:163], chars[:, 163] = _encode(solved, self.blank), NEWLINE
+        return chars.tobytes()
+
+
+    def close(self):
+        if self._header:
+            # Empty csv files still have the header
+            self._file.write(CSV_HEADER)
+            self._header = False
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def read_sudokus(file, format=None, **kwargs):
+    '''
+    Its the same as SudokuReader(file, format, **kwargs).read()
+    '''
+    return SudokuReader(file, format, **kwargs).read()
+
+
+def write_sudokus(file, sudokus, solutions=None, format='lines', **kwargs):
+    '''
+    Writes the given sudokus to a file (check SudokuWriter.write())
+    '''
+    with SudokuWriter(file, format, **kwargs) as writer:
+        writer.write(sudokus, solutions)
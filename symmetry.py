@@ -0,0 +1,264 @@
+'''
+This module defines the symmetries of sudoku configurations: transformations which map valid
+sudokus to valid sudokus with the same number of solutions (relabelling of the numbers,
+transposition, permutations of the bands and stacks and permutations of the rows inside a band
+or the columns inside a stack).
+Sudokus which are equivalent under those transformations have the same canonical form.
+'''
+
+import numpy as np
+from itertools import permutations, product
+
+
+
+class SudokuTransform:
+    '''
+    Instances of this class represent a symmetry of the sudoku. It is stored as a permutation of
+    the 81 cells and a relabelling of the numbers: The kth cell (in row-major order) of the
+    transformed sudoku is digits[values[cells[k]]] where values are the cells of the original sudoku.
+    '''
+    __slots__ = ('cells', 'digits')
+
+    def __init__(self, cells=None, digits=None):
+        '''
+        Constructor.
+        :param cells: A permutation of the cells (array of 81 indices). Identity by default
+        :param digits: An array of size 10 with the new label of each number (digits[0] must be 0).
+        Identity by default
+        '''
+        self.cells = np.arange(0, 81) if cells is None else np.asarray(cells)
+        self.digits = np.arange(0, 10, dtype=np.uint8) if digits is None else np.asarray(digits, dtype=np.uint8)
+
+
+    @classmethod
+    def geometric(cls, rows, columns, transpose=False):
+        '''
+        Creates a transformation which reorders the rows and columns of the sudoku and then
+        optionally transposes it.
+        :param rows: The row i of the new sudoku will be the row rows[i] of the original one.
+        :param columns: Same as rows but for columns
+        '''
+        cells = np.asarray(rows).reshape([9, 1]) * 9 + np.asarray(columns).reshape([1, 9])
+        if transpose:
+            cells = cells.T
+        return cls(cells.flatten())
+
+
+    def apply(self, values):
+        '''
+        Applies this transformation on the given sudoku configuration. Returns an uint8 array of
+        shape (9, 9) with the numbers of the transformed sudoku.
+        :param values: A Sudoku instance or an array-like with 81 numbers
+        '''
+        values = np.asarray(getattr(values, 'values', values), dtype=np.uint8).reshape(81)
+        return self.digits[values[self.cells]].reshape([9, 9])
+
+
+    def __call__(self, sudoku):
+        '''
+        Same as apply() but returns a new Sudoku instance
+        '''
+        from sudoku import Sudoku
+        return Sudoku.from_buffer(self.apply(sudoku))
+
+
+    def inverse(self):
+        '''
+        Returns the inverse of this transformation
+        '''
+        cells, digits = np.empty_like(self.cells), np.empty_like(self.digits)
+        cells[self.cells], digits[self.digits] = np.arange(0, 81), np.arange(0, 10)
+        return SudokuTransform(cells, digits)
+
+
+    def __mul__(self, other):
+        '''
+        Composition of transformations: (a * b)(sudoku) is the same as a(b(sudoku))
+        '''
+        return SudokuTransform(other.cells[self.cells], self.digits[other.digits])
+
+
+    def __eq__(self, other):
+        return isinstance(other, SudokuTransform) and np.array_equal(self.cells, other.cells) and\
+            np.array_equal(self.digits, other.digits)
+
+    def __repr__(self):
+        return 'SudokuTransform(cells={}, digits={})'.format(self.cells.tolist(), self.digits.tolist())
+
+
+
+### Canonical forms
+
+# Orders of the 9 rows (or columns) which keep the bands (or stacks) together: 6 orders of the bands
+# times 6 orders of the rows inside each band (array of shape (1296, 9))
+LINE_ORDERS = np.array([
+    [band * 3 + order[k] for band, order in zip(bands, orders) for k in range(0, 3)]
+    for bands in permutations(range(0, 3)) for orders in product(permutations(range(0, 3)), repeat=3)])
+
+# BAND_OF_LINE[i] is the band (or stack) of the ith row (or column)
+BAND_OF_LINE = np.arange(0, 9) // 3
+
+# Labels not assigned yet (during the canonicalization)
+UNASSIGNED = 15
+
+# Powers of 10 used to compare rows of 9 numbers lexicographically (as integers)
+POW10 = 10 ** np.arange(8, -1, -1, dtype=np.int64)
+
+
+def random_transform(rng=np.random):
+    '''
+    Returns a random symmetry of the sudoku (uniformly chosen among all the combinations of
+    transposition, permutations of bands, stacks, rows inside bands, columns inside stacks and
+    relabelling)
+    :param rng: A numpy RandomState or Generator instance
+    '''
+    rows, columns = LINE_ORDERS[rng.integers(1296, size=2) if hasattr(rng, 'integers') else rng.randint(1296, size=2)]
+    digits = np.concatenate([[0], rng.permutation(9) + 1])
+    return SudokuTransform(SudokuTransform.geometric(rows, columns, rng.random() < 0.5).cells, digits)
+
+
+def _group_min(values, groups):
+    # Returns the minimum of each group of consecutive values (groups must be sorted) and the
+    # minimum of the group of each value
+    starts = np.flatnonzero(np.diff(groups, prepend=-1))
+    mins = np.minimum.reduceat(values, starts)
+    return mins, np.repeat(mins, np.diff(starts, append=len(groups)))
+
+
+def _allowed_lines(chosen):
+    '''
+    Returns a boolean array of shape (n, 9) with the rows (or columns) that can be chosen next
+    given the ones already chosen (array of shape (n, k)): Rows of the same band must be consecutive.
+    '''
+    n, k = chosen.shape
+    used = np.zeros([n, 9], dtype=np.bool_)
+    used[np.arange(0, n)[:, np.newaxis], chosen] = True
+    if k % 3 == 0:
+        return ~used.reshape([-1, 3, 3]).any(axis=2)[:, BAND_OF_LINE]
+    return (BAND_OF_LINE == BAND_OF_LINE[chosen[:, -1]][:, np.newaxis]) & ~used
+
+
+def minlex_canonical_forms(sudokus, batch_size=32):
+    '''
+    Computes the canonical forms of several sudokus at once: The lexicographically minimal
+    configurations (cells in row-major order, empty cells are zeros) among all the sudokus
+    equivalent to them under the whole symmetry group (transposition, permutations of bands,
+    stacks, rows inside bands and columns inside stacks and relabelling of the numbers).
+    Equivalent sudokus have the same canonical form.
+
+    The cells of the canonical forms are chosen one by one (in row-major order). The candidate
+    transformations of all the sudokus are kept in numpy arrays: on each step, they are expanded
+    with all the rows (or columns while filling the first row) allowed and only the candidates which
+    give the minimal number are kept (the relabelling is fixed by order of appearance). This prunes
+    most of the 3359232 geometric transformations early. Candidates which lead to the same state
+    (same rows and columns used and labels) are merged.
+
+    :param sudokus: A SudokuBatch instance or an array-like of shape (n, 9, 9) or (n, 81)
+    :param batch_size: Number of sudokus processed at once
+    :return Returns a tuple with the canonical configurations (uint8 array of shape (n, 9, 9)) and
+    the transformations which map each sudoku to its canonical form
+    '''
+    values = np.asarray(getattr(sudokus, 'values', sudokus), dtype=np.uint8).reshape([-1, 81])
+    canonical, transforms = np.zeros([values.shape[0], 9, 9], dtype=np.uint8), []
+    for start in range(0, values.shape[0], batch_size):
+        transforms.extend(_minlex_canonical_forms(values[start:start + batch_size], canonical[start:start + batch_size]))
+    return canonical, transforms
+
+
+def _relabel(values, sudoku, transposed, rows, columns, labels, assigned):
+    '''
+    Returns the numbers of the given cells of the candidates (the cells at the intersection of the
+    given rows and columns of their sudokus) relabelled. The numbers not seen yet get new labels by
+    order of appearance (labels and assigned are updated)
+    '''
+    index = np.arange(0, len(sudoku))[:, np.newaxis]
+    cells = np.where(transposed[:, np.newaxis], columns * 9 + rows, rows * 9 + columns)
+    numbers = values[sudoku[:, np.newaxis] * 81 + cells]
+    for j in range(0, numbers.shape[1]):
+        num = numbers[:, j]
+        unassigned = labels[index[:, 0], num] == UNASSIGNED
+        if np.any(unassigned):
+            assigned += unassigned
+            labels[index[unassigned, 0], num[unassigned]] = assigned[unassigned]
+    return labels[index, numbers]
+
+
+def _minlex_canonical_forms(values, canonical):
+    # Computes the canonical forms of a batch of sudokus (values must have shape (n, 81)). They
+    # are written on canonical. Returns the transformations
+    n = values.shape[0]
+    values = values.flatten()
+
+    # Candidates: sudoku, transposition, rows and columns chosen, labels and number of labels
+    # assigned (they are always sorted by sudoku). The columns are chosen with the first row
+    sudoku = np.repeat(np.arange(0, n), 2)
+    transposed = np.tile(np.arange(0, 2), n)
+    rows = np.zeros([2 * n, 0], dtype=np.int64)
+    columns = np.zeros([2 * n, 0], dtype=np.int64)
+    labels = np.full([2 * n, 10], UNASSIGNED, dtype=np.uint8)
+    labels[:, 0] = 0
+    assigned = np.zeros(2 * n, dtype=np.uint8)
+
+    def select(k):
+        nonlocal sudoku, transposed, rows, columns, labels, assigned
+        sudoku, transposed, rows, columns, labels, assigned = \
+            sudoku[k], transposed[k], rows[k], columns[k], labels[k], assigned[k]
+
+    for r in range(0, 9):
+        k, row = np.nonzero(_allowed_lines(rows))
+        select(k)
+        rows = np.concatenate([rows, row[:, np.newaxis]], axis=1)
+
+        if r == 0 or len(sudoku) > 16 * n:
+            # Choose the cells of the row one by one (and the columns if its the first row): relabel
+            # the numbers by order of appearance and keep only the candidates which give the
+            # minimal number
+            for j in range(0, 9):
+                if r == 0:
+                    k, column = np.nonzero(_allowed_lines(columns))
+                    select(k)
+                    columns = np.concatenate([columns, column[:, np.newaxis]], axis=1)
+                label = _relabel(values, sudoku, transposed, rows[:, r:r + 1], columns[:, j:j + 1], labels, assigned)[:, 0]
+                canonical[:, r, j], mins = _group_min(label, sudoku)
+                select(label == mins)
+        else:
+            # Few candidates left: choose the whole row at once
+            numbers = _relabel(values, sudoku, transposed, rows[:, r:r + 1], columns, labels, assigned)
+            keys = numbers.astype(np.int64) @ POW10
+            keep = keys == _group_min(keys, sudoku)[1]
+            select(keep)
+            canonical[:, r] = numbers[keep][np.flatnonzero(np.diff(sudoku, prepend=-1))]
+
+        # Merge the candidates with the same state
+        lines = np.bitwise_or.reduce(1 << rows, axis=1) | (transposed << 9) |\
+            (columns << (10 + 4 * np.arange(0, 9))).sum(axis=1)
+        numbers = (labels[:, 1:].astype(np.int64) << (4 * np.arange(0, 9))).sum(axis=1)
+        order = np.lexsort([numbers, lines, sudoku])
+        select(order[(np.diff(numbers[order], prepend=-1) != 0) | (np.diff(lines[order], prepend=-1) != 0) |
+            (np.diff(sudoku[order], prepend=-1) != 0)])
+
+    # Transformations of the first candidate of each sudoku
+    transforms = []
+    for k in np.flatnonzero(np.diff(sudoku, prepend=-1)):
+        # Numbers not present on the sudoku get the labels left
+        digits = labels[k]
+        missing = digits == UNASSIGNED
+        digits[missing] = np.setdiff1d(np.arange(1, 10), digits[~missing])
+        if transposed[k]:
+            transform = SudokuTransform.geometric(columns[k], rows[k], transpose=True)
+        else:
+            transform = SudokuTransform.geometric(rows[k], columns[k])
+        transform.digits = digits
+        transforms.append(transform)
+    return transforms
+
+
+def minlex_canonical_form(sudoku):
+    '''
+    Same as minlex_canonical_forms but for a single sudoku.
+    :param sudoku: A Sudoku instance or an array-like with 81 numbers
+    :return Returns a tuple with the canonical configuration (uint8 array of shape (9, 9)) and the
+    transformation which maps the sudoku to it
+    '''
+    canonical, transforms = minlex_canonical_forms(np.asarray(getattr(sudoku, 'values', sudoku)).reshape([1, 81]))
+    return canonical[0], transforms[0]
@@ -0,0 +1,98 @@
+
+
+
+import unittest
+from unittest import TestCase
+import os
+import numpy as np
+from tempfile import TemporaryDirectory
+from benchmark import BenchmarkResult, run_benchmark, get_puzzles, save_results, load_results, compare_results
+from solvers import DLXSudokuSolver, BasicSudokuIterativeSolver
+from sudoku import Sudoku
+from sudokuio import write_sudokus
+from tests.test_solvers import UNSOLVABLE_SUDOKU
+
+
+
+class TestBenchmark(TestCase):
+    '''
+    Test cases for the benchmark harness
+    '''
+
+    def test_run_benchmark(self):
+        '''
+        run_benchmark() returns the accuracy, the distribution of the solve times and the throughput
+        '''
+        puzzles, solutions = get_puzzles(10, seed=0, clues=30)
+        self.assertEqual(len(puzzles), 10)
+        self.assertTrue(all(puzzle < solution for puzzle, solution in zip(puzzles, solutions)))
+        self.assertTrue(all(a == b for a, b in zip(puzzles, get_puzzles(10, seed=0, clues=30)[0])))
+
+        result = run_benchmark(DLXSudokuSolver(), puzzles + [Sudoku.fromstring(UNSOLVABLE_SUDOKU)],
+                               solutions + [None], name='dlx', warmup=3)
+        self.assertEqual(result.solver, 'dlx')
+        self.assertEqual((result.count, result.solved, result.unsolved, result.invalid), (11, 10, 1, 0))
+        self.assertAlmostEqual(result.accuracy, 10 / 11)
+        self.assertTrue(0 < result.p50 <= result.p90 <= result.p99 <= result.max)
+        self.assertTrue(result.throughput > 0 and result.elapsed > 0)
+
+        self.assertIsNone(result.stats)
+        self.assertEqual(list(result.slowest(3)), list(np.argsort(result.times)[::-1][:3]))
+
+        # Counters of each puzzle and their histograms
+        result = run_benchmark(DLXSudokuSolver(), puzzles, solutions, stats=True)
+        self.assertEqual(result.stats['nodes'].shape, (10,))
+        self.assertTrue(np.all(result.stats['nodes'] >= 51))
+        counts, edges = result.histograms(bins=4)['nodes']
+        self.assertEqual(counts.sum(), 10)
+        self.assertEqual(set(result.histograms()), {'time', 'nodes', 'backtracks', 'remaining_numbers_calls',
+                                                     'valid_calls', 'valid_time'})
+
+        # Puzzles which exceed the limits are counted as timeouts
+        result = run_benchmark(DLXSudokuSolver(), puzzles, solutions, max_nodes=0, warmup=3)
+        self.assertEqual((result.solved, result.unsolved, result.invalid, result.timeouts), (0, 0, 0, 10))
+        self.assertIn('10 timeouts', str(result))
+
+        # Any solution is accepted if they are not given
+        sudokus = [solution.copy() for solution in solutions]
+        for sudoku in sudokus:
+            del sudoku[4, 4]
+        result = run_benchmark(BasicSudokuIterativeSolver(), sudokus)
+        self.assertEqual(result.solver, 'BasicSudokuIterativeSolver')
+        self.assertEqual(result.accuracy, 1.0)
+
+        # Puzzles read from csv files with or without solutions
+        with TemporaryDirectory() as path:
+            for name, expected in (('solved.csv', solutions), ('unsolved.csv', None)):
+                write_sudokus(os.path.join(path, name), puzzles, expected, format='csv')
+                loaded, loaded_solutions = get_puzzles(10, source='file', path=os.path.join(path, name))
+                self.assertTrue(all(a == b for a, b in zip(loaded, puzzles)))
+                self.assertEqual(loaded_solutions is None, expected is None)
+
+
+    def test_results_baseline(self):
+        '''
+        Results can be saved as JSON or CSV and compared against a baseline
+        '''
+        puzzles, solutions = get_puzzles(5, seed=1, clues=40)
+        result = run_benchmark(DLXSudokuSolver(), puzzles, solutions, name='dlx')
+        with TemporaryDirectory() as path:
+            for filename in ('results.json', 'results.csv'):
+                save_results([result], os.path.join(path, filename))
+                self.assertEqual(load_results(os.path.join(path, filename)), [result])
+
+        data = result.to_dict()
+        del data['timeouts']
+        self.assertEqual(BenchmarkResult.from_dict(data), result)
+
+        self.assertEqual(compare_results([result], [result]), [])
+        slower = result._replace(p50=result.p50 * 1.5, accuracy=0.8)
+        regressions = compare_results([slower], [result], threshold=0.2)
+        self.assertEqual({(solver, metric) for solver, metric, old, new, change in regressions},
+                         {('dlx', 'p50'), ('dlx', 'accuracy')})
+        self.assertEqual(compare_results([slower], [result], threshold=0.6, metrics=('p50',))[0][1], 'accuracy')
+        self.assertEqual(compare_results([slower._replace(solver='other')], [result]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
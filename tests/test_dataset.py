@@ -0,0 +1,173 @@
+
+
+
+import unittest
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+import dataset
+from dataset import SudokuDataset
+from sudoku import Sudoku, SudokuBatch
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from solvers import DLXSudokuSolver
+
+
+
+
+class TestSudokuDataset(TestCase):
+    '''
+    Test cases for SudokuDataset class. A small csv file with the same format as the kaggle
+    dataset is created for each test
+    '''
+
+    def setUp(self):
+        # Create sudokus relabelling the numbers of a solved configuration
+        solution = np.array(next(DLXSudokuSolver().search(Sudoku())), dtype=np.uint8)
+        rng = np.random.RandomState(0)
+        self.entries = []
+        for k in range(0, 120):
+            relabel = np.concatenate([[0], rng.permutation(9) + 1]).astype(np.uint8)
+            solved = relabel[solution]
+            unsolved = solved * (rng.random_sample(81) < 0.6)
+            self.entries.append((unsolved, solved))
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.prev_url = dataset.DATASET_URL
+        dataset.DATASET_URL = os.path.join(self.dir.name, 'sudoku.csv')
+        with open(dataset.DATASET_URL, 'w') as f:
+            f.write('quizzes,solutions\n')
+            for unsolved, solved in self.entries:
+                f.write('{},{}\n'.format(''.join(map(str, unsolved)), ''.join(map(str, solved))))
+
+
+    def tearDown(self):
+        dataset.DATASET_URL = self.prev_url
+        self.dir.cleanup()
+
+
+    def test_dataset_cache(self):
+        '''
+        The csv file is converted to a binary file which is memory mapped
+        '''
+        data = SudokuDataset().data
+        self.assertTrue(os.path.exists(SudokuDataset().cache_path))
+        self.assertIsInstance(data, np.memmap)
+        self.assertEqual(data.shape, (120, 2, 81))
+        for k, (unsolved, solved) in enumerate(self.entries):
+            self.assertTrue(np.all(data[k, 0] == unsolved))
+            self.assertTrue(np.all(data[k, 1] == solved))
+
+        # Several builds at the same time dont interfere (temporary files have unique names)
+        with ThreadPoolExecutor(4) as executor:
+            for future in [executor.submit(SudokuDataset().build_cache) for k in range(0, 4)]:
+                future.result()
+        self.assertEqual(sorted(os.listdir(self.dir.name)), ['sudoku.csv', 'sudoku.npy', 'sudoku.npy.json'])
+        self.assertEqual(len(SudokuDataset()), 120)
+
+
+    def test_dataset_cache_rebuild(self):
+        '''
+        The binary file is rebuilt when the csv file changes
+        '''
+        self.assertEqual(SudokuDataset().data.shape[0], 120)
+        with open(dataset.DATASET_URL, 'a') as f:
+            unsolved, solved = self.entries[0]
+            f.write('{},{}\n'.format(''.join(map(str, unsolved)), ''.join(map(str, solved))))
+        self.assertEqual(SudokuDataset().data.shape[0], 121)
+
+
+    def test_dataset_get_samples(self):
+        '''
+        get_samples returns pairs of sudokus and their solutions
+        '''
+        samples = SudokuDataset().get_samples(shuffle=False)
+        for unsolved, solved in [next(samples) for k in range(0, 10)]:
+            self.assertIsInstance(unsolved, Sudoku)
+            self.assertTrue(unsolved < solved and solved.solved)
+
+
+    def test_dataset_indexing(self):
+        '''
+        Entries can be accessed by index, slices or arrays of indices
+        '''
+        dataset = SudokuDataset()
+        self.assertEqual(len(dataset), 120)
+
+        unsolved, solved = dataset[3]
+        self.assertTrue(np.all(unsolved.values.flatten() == self.entries[3][0]))
+        self.assertTrue(np.all(solved.values.flatten() == self.entries[3][1]))
+
+        indices = np.array([7, 2, 100])
+        unsolved, solved = dataset[indices]
+        self.assertIsInstance(unsolved, SudokuBatch)
+        for k, i in enumerate(indices):
+            self.assertTrue(np.all(unsolved.values[k].flatten() == self.entries[i][0]))
+            self.assertTrue(np.all(solved.values[k].flatten() == self.entries[i][1]))
+        self.assertEqual(len(dataset[10:20][0]), 10)
+
+
+    def test_dataset_shuffle(self):
+        '''
+        When shuffle is True, get_samples returns all the entries in a random order (reproducible
+        via random_seed)
+        '''
+        def get_samples(random_seed):
+            samples = SudokuDataset().get_samples(random_seed=random_seed, return_solutions=False, batch_size=16)
+            return [sample.values.tobytes() for sample in islice(samples, 120)]
+
+        samples = get_samples(1)
+        self.assertEqual(samples, get_samples(1))
+        self.assertNotEqual(samples, get_samples(2))
+        self.assertEqual(sorted(samples), sorted(unsolved.tobytes() for unsolved, solved in self.entries))
+
+
+    def test_dataset_get_batches(self):
+        '''
+        get_batches returns batches of sudokus and their solutions
+        '''
+        batches = SudokuDataset().get_batches(batch_size=50, shuffle=False)
+        for k in range(0, 3):
+            unsolved, solved = next(batches)
+            self.assertIsInstance(unsolved, SudokuBatch)
+            self.assertEqual(len(unsolved), 50 if k < 2 else 20)
+            self.assertTrue(np.all(solved.solved))
+            self.assertTrue(np.all(unsolved.valid))
+
+
+    def test_dataset_invalid_solution(self):
+        '''
+        get_samples raises ValueError if an entry is not consistent with its solution
+        '''
+        unsolved, solved = self.entries[5]
+        unsolved = unsolved.copy()
+        k = np.flatnonzero(unsolved)[0]
+        unsolved[k] = unsolved[k] % 9 + 1
+        with open(dataset.DATASET_URL, 'a') as f:
+            f.write('{},{}\n'.format(''.join(map(str, unsolved)), ''.join(map(str, solved))))
+        self.assertRaises(ValueError, SudokuDataset().build_cache)
+
+
+    def test_dataset_shards(self):
+        '''
+        The shards of the dataset are disjoint and together they have the same samples (in the
+        same order) as the whole dataset on each epoch
+        '''
+        def get_samples(**kwargs):
+            samples = SudokuDataset().get_samples(random_seed=5, return_solutions=False, batch_size=16, epoch=1, **kwargs)
+            return [sample.values.tobytes() for sample in samples]
+
+        shards = [get_samples(shard_index=k, num_shards=3) for k in range(0, 3)]
+        self.assertEqual([len(shard) for shard in shards], [40, 40, 40])
+        self.assertEqual(shards[0] + shards[1] + shards[2], get_samples())
+        self.assertNotEqual(get_samples(), [sample.values.tobytes() for sample in
+            SudokuDataset().get_samples(random_seed=5, return_solutions=False, epoch=2)])
+        self.assertRaises(ValueError, next, SudokuDataset().get_samples(shard_index=0, num_shards=2))
+
+        # Empty shards end even without epoch
+        self.assertEqual(list(SudokuDataset().get_batches(random_seed=5, shard_index=0, num_shards=200)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+
+
+
+import unittest
+from unittest import TestCase
+from io import BytesIO
+from generator import SudokuGenerator, rate, DIFFICULTIES
+from sudoku import Sudoku
+from sudokuio import read_sudokus
+from solvers import count_solutions
+from tests.test_solvers import EASY_SUDOKU, HARD_SUDOKU
+
+
+
+class TestGenerator(TestCase):
+    '''
+    Test cases for the puzzle generator
+    '''
+
+    def test_generate(self):
+        '''
+        Generated puzzles have a unique solution and the number of clues requested. Its solution
+        is returned too
+        '''
+        generator = SudokuGenerator(clues=30, seed=7)
+        for k in range(0, 10):
+            puzzle, solution = generator.generate(k)
+            self.assertTrue(puzzle.valid)
+            self.assertEqual(81 - puzzle.empty_cells_count, 30)
+            self.assertEqual(count_solutions(puzzle), 1)
+            self.assertTrue(solution.solved and puzzle < solution)
+        self.assertEqual(count_solutions(Sudoku.random()), 1)
+        self.assertRaises(ValueError, SudokuGenerator, clues=16)
+        self.assertRaises(ValueError, SudokuGenerator, difficulty='extreme')
+
+
+    def test_generate_difficulty(self):
+        '''
+        Generated puzzles have the difficulty requested
+        '''
+        # The 17 clues sudoku can be solved with singles but the other one needs more techniques
+        self.assertEqual(rate(Sudoku.fromstring(HARD_SUDOKU)), 'easy')
+        self.assertEqual(rate(Sudoku.fromstring(EASY_SUDOKU)), 'medium')
+        self.assertEqual(rate(Sudoku()), 'hard')
+        for difficulty in DIFFICULTIES:
+            puzzle, solution = SudokuGenerator(difficulty=difficulty, seed=1).generate()
+            self.assertEqual(rate(puzzle), difficulty)
+            self.assertEqual(count_solutions(puzzle), 1)
+
+
+    def test_generate_seed(self):
+        '''
+        The puzzles only depend on the seed and their index (not on the number of processes used)
+        '''
+        generator = SudokuGenerator(clues=35, seed=3)
+        puzzles, solutions = generator.generate_batch(8)
+        self.assertTrue(puzzles[5] == generator.generate(5)[0])
+        self.assertTrue(SudokuGenerator(clues=35, seed=3).generate(2)[0] == puzzles[2])
+        self.assertFalse(SudokuGenerator(clues=35, seed=4).generate(2)[0] == puzzles[2])
+        self.assertEqual(
+            [puzzle.to_bytes() for puzzle, solution in generator.generate_many(8, workers=2, chunksize=3)],
+            [puzzle.to_bytes() for puzzle in puzzles])
+
+
+    def test_generate_write(self):
+        '''
+        Puzzles can be written directly on the bulk formats
+        '''
+        generator = SudokuGenerator(clues=40, seed=5)
+        puzzles, solutions = generator.generate_batch(10)
+        for format in ('lines', 'csv'):
+            file = BytesIO()
+            generator.write(file, 10, format=format, block_size=3)
+            file.seek(0)
+            result = read_sudokus(file, format, solutions=format == 'csv')
+            if format == 'csv':
+                result, solved = result
+                self.assertTrue((solved.values == solutions.values).all())
+            self.assertTrue((result.values == puzzles.values).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
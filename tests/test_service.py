@@ -0,0 +1,152 @@
+
+
+
+import unittest
+from unittest import TestCase
+import asyncio
+import json
+import os
+import signal
+from concurrent.futures.process import BrokenProcessPool
+from service import SudokuService, ServiceOverloaded
+from sudoku import Sudoku
+from tests.test_solvers import EASY_SUDOKU, HARD_SUDOKU, UNSOLVABLE_SUDOKU
+
+
+
+class TestService(TestCase):
+    '''
+    Test cases for the asyncio solving service
+    '''
+
+    def test_service_solve(self):
+        '''
+        The service solves the puzzles submitted (in batches) and reports the errors and metrics
+        '''
+        async def run():
+            async with SudokuService('dlx', max_batch=4, max_delay=0.01) as service:
+                sudokus = [Sudoku.fromstring(s) for s in [EASY_SUDOKU, HARD_SUDOKU, UNSOLVABLE_SUDOKU] * 3]
+                results = await asyncio.gather(*[service.solve(sudoku) for sudoku in sudokus])
+                expired = await service.solve(Sudoku.fromstring(HARD_SUDOKU), timeout=0)
+                return sudokus, results, expired, service.metrics()
+
+        sudokus, results, expired, metrics = asyncio.run(run())
+        self.assertEqual([result.error for result in results], [None, None, 'unsolved'] * 3)
+        for sudoku, result in zip(sudokus, results):
+            if result.solved:
+                self.assertTrue(result.solution.solved and sudoku < result.solution)
+            self.assertTrue(result.latency >= result.elapsed)
+        self.assertEqual(expired.error, 'timeout')
+
+        self.assertEqual((metrics['requests'], metrics['completed'], metrics['queue_depth']), (10, 10, 0))
+        self.assertEqual(metrics['errors'], {'unsolved': 3, 'timeout': 1})
+        self.assertTrue(metrics['batches'] >= 3 and metrics['mean_batch_size'] <= 4)
+        self.assertTrue(0 < metrics['latency']['p50'] <= metrics['latency']['max'])
+
+
+    def test_service_backpressure(self):
+        '''
+        Requests wait (or are rejected) when the queue is full
+        '''
+        async def run():
+            async with SudokuService('dlx', max_batch=1, max_queue=2) as service:
+                # The dispatcher doesnt run until this coroutine waits, so the queue gets full
+                futures = [await service.submit(Sudoku.fromstring(EASY_SUDOKU), block=False) for k in range(0, 2)]
+                with self.assertRaises(ServiceOverloaded):
+                    await service.submit(Sudoku.fromstring(EASY_SUDOKU), block=False)
+                futures.append(await service.submit(Sudoku.fromstring(EASY_SUDOKU)))
+                return await asyncio.gather(*futures)
+
+        self.assertEqual([result.error for result in asyncio.run(run())], [None] * 3)
+
+
+    def test_service_deadlines(self):
+        '''
+        The time waiting for a worker counts towards the timeout of the requests
+        '''
+        async def run():
+            async with SudokuService('deepsearch', max_batch=1, max_delay=0) as service:
+                return await asyncio.gather(*[service.solve(Sudoku.fromstring(HARD_SUDOKU), timeout=0.05) for k in range(0, 4)])
+
+        results = asyncio.run(run())
+        self.assertEqual([result.error for result in results], ['timeout'] * 4)
+        self.assertTrue(max(result.latency for result in results) < 0.09)
+
+
+    def test_service_errors(self):
+        '''
+        Invalid timeouts are rejected and the pool of processes is replaced if a worker dies
+        '''
+        for timeout in (float('inf'), float('nan'), -1, True):
+            self.assertRaises(ValueError, SudokuService, 'dlx', timeout=timeout)
+
+        async def run():
+            async with SudokuService('dlx') as service:
+                with self.assertRaises(ValueError):
+                    await service.submit(Sudoku.fromstring(EASY_SUDOKU), timeout=float('inf'))
+                for process in list(service._executor._processes.values()):
+                    os.kill(process.pid, signal.SIGKILL)
+                with self.assertRaises(BrokenProcessPool):
+                    while True:
+                        await service.solve(Sudoku.fromstring(EASY_SUDOKU))
+                return await service.solve(Sudoku.fromstring(EASY_SUDOKU))
+
+        self.assertTrue(asyncio.run(run()).solved)
+
+
+    def test_service_stop(self):
+        '''
+        Stopping the service cancels the requests not finished yet (including the ones being solved)
+        '''
+        async def run():
+            service = SudokuService('dlx', max_batch=64, max_delay=0)
+            await service.start()
+            futures = [await service.submit(Sudoku.fromstring(HARD_SUDOKU)) for k in range(0, 256)]
+            while service.in_flight == 0:
+                await asyncio.sleep(0.001)
+            await service.stop()
+            return futures
+
+        futures = asyncio.run(run())
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertTrue(any(future.cancelled() for future in futures))
+
+
+    def test_service_tcp(self):
+        '''
+        Clients send newline-delimited JSON requests over TCP and receive a response for each one
+        '''
+        requests = [dict(id=0, sudoku=EASY_SUDOKU), dict(id=1, sudoku=HARD_SUDOKU.replace('0', '.'), timeout=10),
+                    dict(id=2, sudoku='123'), dict(id=3, op='metrics'), dict(id=4, sudoku=EASY_SUDOKU, timeout=float('inf')),
+                    dict(id=5, sudoku=EASY_SUDOKU, timeout=True)]
+
+        async def run():
+            async with SudokuService('dlx') as service:
+                server = await service.serve_tcp('127.0.0.1', 0)
+                reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+                writer.write(b''.join(json.dumps(request).encode() + b'\n' for request in requests) + b'not json\n' +
+                             b'{"id": 6, "sudoku": "' + b'0' * (1 << 17) + b'"}\n' + json.dumps(requests[0]).encode())
+                writer.write_eof()
+                responses = [json.loads(line) for line in (await reader.read()).splitlines()]
+                writer.close()
+                server.close()
+                await server.wait_closed()
+                return responses
+
+        responses = asyncio.run(run())
+        # The request too long and the one which isnt JSON have no id
+        self.assertEqual([response['error'] for response in responses if response['id'] is None], ['bad request'] * 2)
+        self.assertEqual(sorted(response['id'] for response in responses if response['id'] is not None), [0, 0, 1, 2, 3, 4, 5])
+        responses = {response['id']: response for response in responses}
+        for k in (0, 1):
+            self.assertIsNone(responses[k]['error'])
+            solution = Sudoku.fromstring(responses[k]['solution'])
+            self.assertTrue(solution.solved and Sudoku.fromstring(requests[k]['sudoku']) < solution)
+        for k in (2, 4, 5):
+            self.assertEqual(responses[k]['error'], 'bad request')
+        self.assertEqual(responses[None]['error'], 'bad request')
+        self.assertEqual(responses[3]['metrics']['max_queue'], 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,305 @@
+
+
+
+import unittest
+from unittest import TestCase
+from threading import Thread, Barrier
+from contextlib import nullcontext
+import numpy as np
+from sudoku import Sudoku, SudokuCell
+from solvers import DLXSudokuSolver, PropagationSudokuSolver, DeepSearchSudokuSolver, TrailDeepSearchSudokuSolver, CachedSudokuSolver
+from solvers import SudokuIterativeSolver, BasicSudokuIterativeSolver, SolveTimeout
+from solvers import count_solutions, count_solutions_many, is_unique
+from solvers.deepsearchsolver import MRVQueue
+from solvers.stats import SolverStats, instrument
+from symmetry import random_transform
+
+
+# Sudoku taken from notebooks/quizz.txt
+EASY_SUDOKU = '300006002798040000000830000510000070009000100030000069000024000000060914100500008'
+
+# Valid sudoku configuration without solution
+UNSOLVABLE_SUDOKU = '350006002798040000000830000510000070009000100030000069000024000000060914100500008'
+
+# A sudoku with only 17 clues
+HARD_SUDOKU = '000000010400000000020000000000050407008000300001090000300400200050100000000806000'
+
+
+
+class TestSolvers(TestCase):
+    '''
+    Test cases for the sudoku solvers
+    '''
+
+    def assertSolves(self, solver, s):
+        sudoku = Sudoku.fromstring(', '.join(s))
+        result = sudoku.copy()
+        solver.solve(result)
+        self.assertTrue(result.solved)
+        self.assertTrue(sudoku < result)
+
+
+    def test_dlx_solver(self):
+        '''
+        DLXSudokuSolver solves easy and hard sudokus
+        '''
+        solver = DLXSudokuSolver()
+        self.assertSolves(solver, EASY_SUDOKU)
+        self.assertSolves(solver, HARD_SUDOKU)
+
+
+    def test_dlx_solver_unsolvable(self):
+        '''
+        DLXSudokuSolver raises ValueError if the sudoku has no solution
+        '''
+        sudoku = Sudoku.fromstring(', '.join(UNSOLVABLE_SUDOKU))
+        self.assertTrue(sudoku.valid)
+        self.assertRaises(ValueError, DLXSudokuSolver().solve, sudoku)
+
+
+    def test_count_solutions(self):
+        '''
+        count_solutions counts the solutions of a sudoku up to the given limit and is_unique
+        checks if it has exactly one
+        '''
+        self.assertEqual(count_solutions(Sudoku.fromstring(EASY_SUDOKU)), 1)
+        self.assertEqual(count_solutions(Sudoku.fromstring(UNSOLVABLE_SUDOKU)), 0)
+        self.assertEqual(count_solutions(Sudoku(), limit=5), 5)
+        self.assertTrue(is_unique(Sudoku.fromstring(HARD_SUDOKU)))
+
+        # Removing a clue gives more solutions
+        sudoku = Sudoku.fromstring(EASY_SUDOKU)
+        sudoku[1, 2] = 0
+        self.assertFalse(is_unique(sudoku))
+        self.assertEqual(count_solutions(sudoku, limit=None), 6)
+
+        sudokus = [Sudoku.fromstring(s) for s in [EASY_SUDOKU, UNSOLVABLE_SUDOKU, HARD_SUDOKU]] + [sudoku]
+        for workers in (1, 2):
+            self.assertEqual(list(count_solutions_many(sudokus, workers=workers, chunksize=1)), [1, 0, 1, 2])
+
+
+    def test_propagation_solver(self):
+        '''
+        PropagationSudokuSolver solves sudokus which require more techniques than naked singles
+        '''
+        solver = PropagationSudokuSolver()
+        self.assertSolves(solver, EASY_SUDOKU)
+        self.assertSolves(solver, HARD_SUDOKU)
+
+
+    def test_propagation_solver_step(self):
+        '''
+        Each step of PropagationSudokuSolver assigns a number to exactly one empty cell
+        '''
+        sudoku = Sudoku.fromstring(', '.join(EASY_SUDOKU))
+        solver = PropagationSudokuSolver()
+        while not sudoku.full:
+            prev = sudoku.copy()
+            solver.step(sudoku)
+            self.assertTrue(prev < sudoku)
+            self.assertEqual(sudoku.empty_cells_count, prev.empty_cells_count - 1)
+        self.assertTrue(sudoku.solved)
+
+
+    def test_trail_deep_search_solver(self):
+        '''
+        TrailDeepSearchSudokuSolver solves sudokus and raises ValueError if they have no solution
+        '''
+        solver = TrailDeepSearchSudokuSolver()
+        self.assertSolves(solver, EASY_SUDOKU)
+        self.assertSolves(solver, HARD_SUDOKU)
+        self.assertRaises(ValueError, solver.solve, Sudoku.fromstring(', '.join(UNSOLVABLE_SUDOKU)))
+
+
+    def test_trail_deep_search_solver_iterator(self):
+        '''
+        solve_iterator on TrailDeepSearchSudokuSolver yields the cells modified on each step
+        '''
+        sudoku = Sudoku.fromstring(', '.join(EASY_SUDOKU))
+        replay = sudoku.copy()
+        for cell in TrailDeepSearchSudokuSolver().solve_iterator(sudoku):
+            replay[cell.row_index, cell.column_index] = cell.value
+            self.assertTrue(replay == sudoku)
+        self.assertTrue(sudoku.solved)
+
+
+    def test_deep_search_solver_degree_tie_breaking(self):
+        '''
+        Deep search solvers can break ties on the MRV heuristic by degree
+        '''
+        self.assertSolves(DeepSearchSudokuSolver(degree_tie_breaking=True), EASY_SUDOKU)
+        self.assertSolves(TrailDeepSearchSudokuSolver(degree_tie_breaking=True), EASY_SUDOKU)
+
+
+    def test_mrv_queue(self):
+        '''
+        MRVQueue returns the empty cell with less remaining numbers after assigning and clearing cells
+        '''
+        sudoku = Sudoku.fromstring(', '.join(HARD_SUDOKU))
+        queue = MRVQueue(sudoku)
+        for k in [0, 1, 40, 80]:
+            cell = queue.cells[k]
+            cell.value = min(cell.remaining_numbers)
+            queue.assign(k)
+            best = queue.min()
+            self.assertTrue(best.empty)
+            self.assertEqual(len(best.remaining_numbers), min(len(cell.remaining_numbers) for cell in sudoku.empty_cells))
+        for k in [0, 40]:
+            del queue.cells[k].value
+            queue.unassign(k)
+            self.assertEqual(len(queue.min().remaining_numbers), min(len(cell.remaining_numbers) for cell in sudoku.empty_cells))
+
+
+    def test_cached_solver(self):
+        '''
+        CachedSudokuSolver reuses the solutions of equivalent sudokus and evicts the least
+        recently used entries
+        '''
+        solver = CachedSudokuSolver(DLXSudokuSolver(), maxsize=2)
+        self.assertSolves(solver, EASY_SUDOKU)
+        self.assertEqual(tuple(solver.cache_info()), (0, 1, 2, 1))
+
+        # Equivalent sudokus
+        rng = np.random.RandomState(0)
+        for k in range(0, 5):
+            transform = random_transform(rng)
+            self.assertSolves(solver, ''.join(map(str, transform.apply(Sudoku.fromstring(EASY_SUDOKU)).flatten())))
+        self.assertEqual(solver.cache_info().hits, 5)
+
+        self.assertSolves(solver, HARD_SUDOKU)
+        self.assertRaises(ValueError, solver.solve, Sudoku.fromstring(UNSOLVABLE_SUDOKU))
+        self.assertSolves(solver, HARD_SUDOKU)
+        self.assertEqual(tuple(solver.cache_info()), (6, 3, 2, 2))
+
+        # A rotated sudoku is equivalent too. A new sudoku evicts the least recently used entry
+        self.assertSolves(solver, list(reversed(EASY_SUDOKU)))
+        self.assertSolves(solver, '0' + EASY_SUDOKU[1:])
+        self.assertSolves(solver, HARD_SUDOKU)
+        self.assertEqual(tuple(solver.cache_info()), (7, 5, 2, 2))
+
+        # The statistics of the solver wrapped are added to the ones of the cache only while its used
+        stats = solver.enable_stats()
+        solver.cache_clear()
+        self.assertSolves(solver, HARD_SUDOKU)
+        self.assertTrue(stats.nodes > 0)
+        self.assertIsNone(solver.solver.stats)
+
+
+    def test_solve_many(self):
+        '''
+        solve_many returns a result for each sudoku in the stream (in order if ordered is True)
+        '''
+        sudokus = [Sudoku.fromstring(', '.join(s)) for s in [EASY_SUDOKU, UNSOLVABLE_SUDOKU, HARD_SUDOKU]]
+        sudokus.append(list(map(int, EASY_SUDOKU)))
+
+        for workers in (1, 2):
+            results = list(DLXSudokuSolver().solve_many(sudokus, workers=workers, chunksize=1))
+            self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+            self.assertEqual([result.solved for result in results], [True, False, True, True])
+            self.assertEqual(results[1].error, 'unsolved')
+            self.assertIsNone(results[1].solution)
+            for result in results:
+                if result.solved:
+                    self.assertTrue(result.solution.solved and result.sudoku < result.solution)
+
+        results = DLXSudokuSolver().solve_many(sudokus, workers=2, ordered=False, chunksize=1)
+        self.assertEqual(sorted(result.index for result in results), [0, 1, 2, 3])
+
+
+    def test_solver_stats(self):
+        '''
+        Solvers count their search nodes, backtracks and the queries of the cells only when
+        statistics are enabled
+        '''
+        properties = SudokuCell.valid, SudokuCell.remaining_numbers_mask
+        for solver in (DLXSudokuSolver(), DeepSearchSudokuSolver(), TrailDeepSearchSudokuSolver()):
+            self.assertIsNone(solver.stats)
+            solver.solve(Sudoku.fromstring(HARD_SUDOKU))
+            self.assertIsNone(solver.stats)
+
+            total = solver.enable_stats()
+            with solver.collect_stats() as stats:
+                solver.solve(Sudoku.fromstring(HARD_SUDOKU))
+            self.assertEqual(total, stats)
+            # Each decision kept fills a cell at least
+            self.assertTrue(0 < stats.nodes - stats.backtracks <= 64)
+            if not isinstance(solver, DLXSudokuSolver):
+                self.assertTrue(stats.remaining_numbers_calls > 0)
+            self.assertEqual((SudokuCell.valid, SudokuCell.remaining_numbers_mask), properties)
+
+            # Counters of each sudoku (the times may differ)
+            results = list(solver.solve_many([Sudoku.fromstring(HARD_SUDOKU), Sudoku.fromstring(UNSOLVABLE_SUDOKU)]))
+            self.assertEqual(dict(results[0].stats, valid_time=0), dict(stats.to_dict(), valid_time=0))
+            self.assertEqual(results[1].error, 'unsolved')
+            expected = stats + stats + SolverStats(**results[1].stats)
+            self.assertEqual(dict(solver.stats.to_dict(), valid_time=0), dict(expected.to_dict(), valid_time=0))
+            solver.disable_stats()
+            self.assertIsNone(next(solver.solve_many([Sudoku.fromstring(EASY_SUDOKU)])).stats)
+
+        # The queries of the cells made by the validity checks are not counted
+        with instrument(SolverStats()) as stats:
+            self.assertTrue(Sudoku()[0, 0].valid)
+            Sudoku()[0, 0].remaining_numbers_mask
+        self.assertEqual((stats.valid_calls, stats.remaining_numbers_calls), (1, 1))
+
+        # Each thread counts only its own queries
+        barrier = Barrier(3)
+        def query(n, stats=None):
+            with instrument(stats) if stats is not None else nullcontext():
+                barrier.wait()
+                for k in range(0, n):
+                    Sudoku()[0, 0].remaining_numbers_mask
+                barrier.wait()
+        counters = [SolverStats(), SolverStats()]
+        threads = [Thread(target=query, args=(100, counters[0])), Thread(target=query, args=(200, counters[1])),
+                   Thread(target=query, args=(300,))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([stats.remaining_numbers_calls for stats in counters], [100, 200])
+        self.assertEqual((SudokuCell.valid, SudokuCell.remaining_numbers_mask), properties)
+
+
+    def test_solve_limits(self):
+        '''
+        solve() raises SolveTimeout when the time or the number of nodes allowed is exceeded
+        '''
+        solvers = (DLXSudokuSolver(), DeepSearchSudokuSolver(), TrailDeepSearchSudokuSolver(),
+                   PropagationSudokuSolver(), BasicSudokuIterativeSolver(), CachedSudokuSolver())
+        # Iterative solvers need one step for each empty cell
+        simple = Sudoku.fromstring(HARD_SUDOKU)
+        DLXSudokuSolver().solve(simple)
+        del simple.rows[0]
+
+        for solver in solvers:
+            sudoku = simple if isinstance(solver, SudokuIterativeSolver) else Sudoku.fromstring(HARD_SUDOKU)
+            self.assertRaises(SolveTimeout, solver.solve, sudoku.copy(), max_nodes=5)
+            self.assertRaises(SolveTimeout, solver.solve, sudoku.copy(), timeout=0)
+            self.assertIsNone(solver.budget)
+
+            # Limits are not exceeded
+            solution = sudoku.copy()
+            solver.solve(solution, timeout=60, max_nodes=100000)
+            self.assertTrue(solution.solved)
+            solution = sudoku.copy()
+            solver.solve(solution, timeout=float('inf'))
+            self.assertTrue(solution.solved)
+
+        # The cached solver also checks the time limit when the sudoku is on the cache
+        cached = solvers[-1]
+        hits = cached.cache_info().hits
+        self.assertRaises(SolveTimeout, cached.solve, Sudoku.fromstring(HARD_SUDOKU), timeout=0)
+        self.assertEqual(cached.cache_info().hits, hits)
+        self.assertIsNone(cached.solver.budget)
+
+        results = list(DLXSudokuSolver().solve_many([Sudoku.fromstring(HARD_SUDOKU), Sudoku.fromstring(UNSOLVABLE_SUDOKU)],
+                                                    max_nodes=5))
+        self.assertEqual([result.error for result in results], ['timeout', 'timeout'])
+        self.assertTrue(all(result.solution is None for result in results))
+        for limits in (dict(timeout=float('nan')), dict(timeout=-1), dict(max_nodes=-1)):
+            self.assertRaises(ValueError, next, DLXSudokuSolver().solve_many([Sudoku.fromstring(HARD_SUDOKU)], **limits))
+
+
+if __name__ == '__main__':
+    unittest.main()
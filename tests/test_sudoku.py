@@ -4,7 +4,8 @@
 import unittest
 from unittest import TestCase
 import numpy as np
-from sudoku import Sudoku, SudokuCell, SudokuSection
+from sudoku import Sudoku, SudokuCell, SudokuSection, SudokuBatch, FrozenSudoku
+import pickle
 from itertools import product
 
 
@@ -79,6 +80,22 @@ class TestSudoku(TestCase):
             self.assertEqual(cell.value, int(cell))
 
 
+    def test_sudoku_cell_reused(self):
+        '''
+        The same SudokuCell instance is returned each time a cell is accessed and its value
+        is read directly from the sudoku
+        '''
+        sudoku = Sudoku.random()
+        for i, j in product(range(0, 9), range(0, 9)):
+            cell = sudoku[i, j]
+            self.assertIs(cell, sudoku[i][j])
+            self.assertIs(cell, sudoku.cell(i * 9 + j))
+            self.assertIs(cell, list(sudoku)[i * 9 + j])
+            self.assertIs(cell, list(sudoku.squares[cell.square_index])[(i % 3) * 3 + j % 3])
+        sudoku.values[4, 4] = 7
+        self.assertEqual(sudoku[4, 4].value, 7)
+
+
     def test_sudoku_cell_set_number(self):
         '''
         setter of 'value' property on SudokuCell instance can be used to change the sudoku number
@@ -134,6 +151,40 @@ class TestSudoku(TestCase):
                     cell.remaining_numbers)
 
 
+    def test_sudoku_cell_remaining_numbers_after_writes(self):
+        '''
+        remaining_numbers and valid on SudokuCell are kept up to date when the sudoku is modified
+        via cells, sections, the rows, columns and squares views, its values, fill() or in-place
+        operators.
+        '''
+        def check(sudoku):
+            for cell in sudoku:
+                if cell != 0:
+                    self.assertEqual(cell.remaining_numbers, frozenset())
+                    self.assertEqual(cell.valid, all(unit.count(cell) == 1 for unit in [cell.row, cell.col, cell.square]))
+                else:
+                    remaining_numbers = cell.row.remaining_numbers & cell.col.remaining_numbers & cell.square.remaining_numbers
+                    self.assertEqual(cell.remaining_numbers, remaining_numbers)
+                    self.assertEqual(cell.valid, len(remaining_numbers) > 0)
+
+        sudoku = Sudoku.random()
+        writes = [
+            lambda: sudoku.__setitem__((0, 0), 5),
+            lambda: sudoku.rows.__setitem__(1, np.random.randint(10, size=9)),
+            lambda: sudoku.columns.__delitem__(2),
+            lambda: sudoku.squares.__setitem__(4, np.random.randint(10, size=9).reshape([3, 3])),
+            lambda: setattr(sudoku[8][8], 'value', 9),
+            lambda: sudoku.squares[8].clear(),
+            lambda: sudoku.values.__setitem__((0, 1), 5),
+            lambda: sudoku.rows[3].values.__setitem__(4, 6),
+            lambda: sudoku.rows[5].fill(2),
+            lambda: sudoku.columns[6].__imul__(0),
+            lambda: sudoku.fill(0)
+        ]
+        for write in writes:
+            write()
+            check(sudoku)
+
 
 
     ### SudokuSection test cases
@@ -423,6 +474,70 @@ class TestSudoku(TestCase):
         self.assertTrue(np.all(sudoku != other))
 
 
+    def test_sudoku_copy_into(self):
+        '''
+        copy_into() overwrites another sudoku with the values of this one, keeping the
+        remaining numbers of its cells consistent
+        '''
+        sudoku, other = Sudoku.random(), Sudoku.random()
+        other[0, 0].remaining_numbers
+        self.assertIs(sudoku.copy_into(other), other)
+        self.assertTrue(np.all(sudoku.values == other.values))
+        other[4, 4] = 0
+        for cell in other:
+            if cell == 0:
+                self.assertEqual(cell.remaining_numbers,
+                    cell.row.remaining_numbers & cell.col.remaining_numbers & cell.square.remaining_numbers)
+
+
+    def test_sudoku_from_buffer(self):
+        '''
+        from_buffer() creates a sudoku which shares its memory with the given buffer
+        '''
+        buffer = bytearray(100)
+        sudoku = Sudoku.from_buffer(buffer, offset=10)
+        sudoku[0, 1] = 7
+        self.assertEqual(buffer[11], 7)
+        buffer[12] = 7
+        self.assertEqual(sudoku[0, 2], 7)
+        self.assertFalse(sudoku.valid)
+
+
+    def test_sudoku_to_bytes(self):
+        '''
+        to_bytes() serializes the sudoku in 81 bytes (or 41 if packed is True) and from_bytes()
+        restores it. Sudokus are pickled in the same way
+        '''
+        sudoku = Sudoku.random()
+        for packed, size in [(False, 81), (True, 41)]:
+            data = sudoku.to_bytes(packed=packed)
+            self.assertEqual(len(data), size)
+            self.assertTrue(Sudoku.from_bytes(data) == sudoku)
+        self.assertRaises(ValueError, Sudoku.from_bytes, bytes(80))
+        self.assertRaises(ValueError, Sudoku.from_bytes, bytes([10] * 81))
+
+        other = pickle.loads(pickle.dumps(sudoku))
+        self.assertIsInstance(other, Sudoku)
+        self.assertTrue(other == sudoku)
+        for a, b in zip(sudoku, other):
+            self.assertEqual(a.remaining_numbers, b.remaining_numbers)
+
+
+    def test_sudoku_freeze(self):
+        '''
+        freeze() returns a hashable snapshot of the sudoku which is not affected by later changes
+        '''
+        sudoku = Sudoku.random()
+        frozen = sudoku.freeze()
+        self.assertIsInstance(frozen, FrozenSudoku)
+        self.assertEqual(frozen, sudoku.copy().freeze())
+        self.assertEqual(len({frozen, sudoku.copy().freeze(), pickle.loads(pickle.dumps(frozen))}), 1)
+        sudoku[0, 0] = sudoku[0, 0].value % 9 + 1
+        self.assertNotEqual(frozen, sudoku.freeze())
+        self.assertTrue(frozen.thaw() == Sudoku.from_bytes(frozen.to_bytes(packed=True)))
+        self.assertFalse(frozen.values.flags.writeable)
+
+
     def test_sudoku_init_values(self):
         '''
         By default, Sudoku() returns a configuration where all the cells are empty
@@ -457,6 +572,18 @@ class TestSudoku(TestCase):
         self.assertTrue(sudoku.valid)
 
 
+    def test_sudoku_valid_cells(self):
+        '''
+        Sudoku.valid is True only if all the sudoku cells are valid
+        '''
+        for k in range(0, 200):
+            sudoku = Sudoku.random(clues=40)
+            # Put a random number on an empty cell (it may be in conflict with its peers)
+            cell = list(sudoku.empty_cells)[np.random.randint(sudoku.empty_cells_count)]
+            cell.value = np.random.randint(9) + 1
+            self.assertEqual(sudoku.valid, all(cell.valid for cell in sudoku))
+
+
     def test_sudoku_solved(self):
         '''
         Sudoku.solved property is True when the sudoku configuration represents a valid
@@ -513,5 +640,57 @@ class TestSudoku(TestCase):
                 b[i, j] = a[i, j]
 
 
+
+
+class TestSudokuBatch(TestCase):
+    '''
+    Test cases for SudokuBatch class
+    '''
+
+    def test_sudoku_batch_from_sudokus(self):
+        '''
+        A batch can be created from a list of sudokus and converted back to a list of sudokus
+        '''
+        sudokus = [Sudoku.random() for k in range(0, 10)]
+        batch = SudokuBatch.from_sudokus(sudokus)
+        self.assertEqual(len(batch), 10)
+        self.assertEqual(batch.values.shape, (10, 9, 9))
+        self.assertEqual(batch.values.dtype, np.uint8)
+        for a, b in zip(sudokus, batch.to_sudokus()):
+            self.assertIsInstance(b, Sudoku)
+            self.assertTrue(a == b)
+
+
+    def test_sudoku_batch_views(self):
+        '''
+        Indexing a batch returns sudokus which are views of the batch
+        '''
+        batch = SudokuBatch.empty(5)
+        sudoku = batch[2]
+        sudoku[4, 4] = 7
+        self.assertEqual(batch.values[2, 4, 4], 7)
+        self.assertEqual(sudoku[4, 3].remaining_numbers, frozenset(range(1, 10)) - {7})
+        self.assertTrue(np.shares_memory(batch[-1].values, batch.values))
+        self.assertEqual(len(batch[1:3]), 2)
+
+
+    def test_sudoku_batch_properties(self):
+        '''
+        valid, full, solved, empty_cells_count and remaining_numbers_masks are evaluated
+        for each configuration in the batch
+        '''
+        sudokus = [Sudoku.random() for k in range(0, 20)]
+        batch = SudokuBatch.from_sudokus(sudokus)
+        masks = batch.remaining_numbers_masks
+
+        for k, sudoku in enumerate(sudokus):
+            self.assertEqual(batch.valid[k], sudoku.valid)
+            self.assertEqual(batch.full[k], sudoku.full)
+            self.assertEqual(batch.solved[k], sudoku.solved)
+            self.assertEqual(batch.empty_cells_count[k], sudoku.empty_cells_count)
+            for cell in sudoku:
+                self.assertEqual(masks[k, cell.row_index, cell.column_index], cell.remaining_numbers_mask)
+
+
 if __name__ == '__main__':
     unittest.main()
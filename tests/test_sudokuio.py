@@ -0,0 +1,103 @@
+
+
+
+import unittest
+from unittest import TestCase
+import io
+import os
+import numpy as np
+from sudoku import Sudoku, SudokuBatch
+from sudokuio import SudokuReader, SudokuWriter, FORMATS, read_sudokus, write_sudokus, detect_format
+from solvers import DLXSudokuSolver
+
+
+
+
+class TestSudokuIO(TestCase):
+    '''
+    Test cases for the bulk sudoku file readers and writers
+    '''
+
+    def setUp(self):
+        # Sudokus created relabelling the numbers of a solved configuration
+        solution = np.array(next(DLXSudokuSolver().search(Sudoku())), dtype=np.uint8)
+        rng = np.random.RandomState(0)
+        relabels = [np.concatenate([[0], rng.permutation(9) + 1]).astype(np.uint8) for k in range(0, 50)]
+        self.solved = SudokuBatch(np.stack([relabel[solution] for relabel in relabels]))
+        self.unsolved = SudokuBatch(self.solved.values * (rng.random_sample([50, 9, 9]) < 0.5))
+
+
+    def test_write_read(self):
+        '''
+        Sudokus written on any format are read back in the same order, regardless of the size
+        of the blocks used to read the file
+        '''
+        for format in FORMATS:
+            f = io.BytesIO()
+            with SudokuWriter(f, format=format, blank='.') as writer:
+                if format == 'csv':
+                    writer.write(self.unsolved, self.solved)
+                else:
+                    writer.write(self.unsolved[:20])
+                    writer.write(list(self.unsolved[20:]))
+            data = f.getvalue()
+            self.assertEqual(detect_format(data), format)
+
+            for block_size in (7, 100, 4096):
+                sudokus = read_sudokus(io.BytesIO(data), block_size=block_size)
+                self.assertIsInstance(sudokus, SudokuBatch)
+                self.assertTrue(np.all(sudokus.values == self.unsolved.values))
+
+                sudokus = list(SudokuReader(io.BytesIO(data), format=format, block_size=block_size))
+                self.assertEqual(len(sudokus), 50)
+                self.assertTrue(all(isinstance(sudoku, Sudoku) for sudoku in sudokus))
+
+
+    def test_read_csv_solutions(self):
+        '''
+        Solutions can be read from csv files
+        '''
+        f = io.BytesIO()
+        write_sudokus(f, self.unsolved, self.solved, format='csv')
+        self.assertTrue(f.getvalue().startswith(b'quizzes,solutions\n'))
+        f.seek(0)
+        unsolved, solved = SudokuReader(f, solutions=True, block_size=1000).read()
+        self.assertTrue(np.all(unsolved.values == self.unsolved.values))
+        self.assertTrue(np.all(solved.values == self.solved.values))
+        self.assertRaises(ValueError, write_sudokus, io.BytesIO(), self.unsolved, self.solved[:10], format='csv')
+
+        # csv files without the solutions column
+        f = io.BytesIO()
+        write_sudokus(f, self.unsolved, format='csv')
+        self.assertTrue(f.getvalue().startswith(b'quizzes\n'))
+        self.assertEqual(detect_format(f.getvalue()), 'csv')
+        for block_size in (7, 1000):
+            f.seek(0)
+            self.assertTrue(np.all(read_sudokus(f, block_size=block_size).values == self.unsolved.values))
+        f.seek(0)
+        self.assertRaises(ValueError, SudokuReader(f, solutions=True).read)
+        with SudokuWriter(io.BytesIO(), format='csv') as writer:
+            writer.write(self.unsolved)
+            self.assertRaises(ValueError, writer.write, self.unsolved, self.solved)
+
+
+    def test_read_grid(self):
+        '''
+        The sudoku in notebooks/quizz.txt can be read with the grid format
+        '''
+        path = os.path.join(os.path.dirname(__file__), '..', 'notebooks', 'quizz.txt')
+        sudokus = read_sudokus(path)
+        self.assertEqual(len(sudokus), 1)
+        self.assertTrue(sudokus[0] == Sudoku.fromfile(path))
+
+
+    def test_read_invalid(self):
+        '''
+        Reading invalid files raises ValueError
+        '''
+        for data in [b'1' * 80 + b'\n', b'1' * 80 + b'a\n', b'1 2 3\n4 5 x\n', b'1 2 3\n']:
+            self.assertRaises(ValueError, read_sudokus, io.BytesIO(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
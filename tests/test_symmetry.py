@@ -0,0 +1,71 @@
+
+
+
+import unittest
+from unittest import TestCase
+import numpy as np
+from sudoku import Sudoku, SudokuBatch
+from symmetry import SudokuTransform, random_transform, minlex_canonical_form
+from solvers import DLXSudokuSolver
+from tests.test_solvers import EASY_SUDOKU, HARD_SUDOKU
+
+
+
+
+class TestSymmetry(TestCase):
+    '''
+    Test cases for the sudoku symmetries and canonical forms
+    '''
+
+    def test_transform(self):
+        '''
+        Transformations keep valid sudokus valid and can be inverted and composed
+        '''
+        rng = np.random.RandomState(0)
+        sudoku = Sudoku.fromstring(HARD_SUDOKU)
+        for k in range(0, 10):
+            a, b = random_transform(rng), random_transform(rng)
+            self.assertTrue(a(sudoku).valid)
+            self.assertEqual(a(sudoku).filled_cells_count, sudoku.filled_cells_count)
+            self.assertTrue(a.inverse()(a(sudoku)) == sudoku)
+            self.assertTrue((a * b)(sudoku) == a(b(sudoku)))
+            self.assertEqual(a * a.inverse(), SudokuTransform())
+
+
+    def test_canonical(self):
+        '''
+        Equivalent sudokus have the same canonical form and the transformation returned by
+        Sudoku.canonical() maps it back to the sudoku
+        '''
+        rng = np.random.RandomState(1)
+        for s in [EASY_SUDOKU, HARD_SUDOKU]:
+            sudoku = Sudoku.fromstring(s)
+            canonical, transform = sudoku.canonical()
+            self.assertTrue(transform(canonical) == sudoku)
+            for k in range(0, 10):
+                other = random_transform(rng)(sudoku)
+                self.assertTrue(other.canonical()[0] == canonical)
+
+        # The canonical form is the minimal one
+        sudoku = Sudoku.fromstring(HARD_SUDOKU)
+        canonical = minlex_canonical_form(sudoku)[0].tobytes()
+        for k in range(0, 50):
+            self.assertLessEqual(canonical, random_transform(rng).apply(sudoku).tobytes())
+
+
+    def test_canonical_batch(self):
+        '''
+        SudokuBatch.canonical() returns the same canonical forms as Sudoku.canonical()
+        '''
+        solution = Sudoku.fromstring(HARD_SUDOKU)
+        DLXSudokuSolver().solve(solution)
+        sudokus = [Sudoku.fromstring(EASY_SUDOKU), Sudoku.fromstring(HARD_SUDOKU), solution, Sudoku()]
+        canonical, transforms = SudokuBatch.from_sudokus(sudokus).canonical()
+        for k, sudoku in enumerate(sudokus):
+            self.assertTrue(canonical[k] == sudoku.canonical()[0])
+            self.assertTrue(transforms[k](canonical[k]) == sudoku)
+        self.assertEqual(canonical[2].to_bytes()[:9], bytes(range(1, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()